@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAAmbisonics.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFAProcessing import getImpulseResponses
+from .SOFASpatial import sphericalHarmonics, sphericalToCartesian
+from .SOFASonixError import SOFAError
+
+
+def sphericalBessel(order, x):
+    # j_n(x) and y_n(x) for n = 0..order - (order + 1, ...)
+    x = np.maximum(np.asarray(x, dtype=float), 1e-9)
+    j = np.empty((order + 1,) + x.shape)
+    y = np.empty((order + 1,) + x.shape)
+    j[0] = np.sin(x) / x
+    y[0] = -np.cos(x) / x
+    if(order > 0):
+        j[1] = np.sin(x) / x ** 2 - np.cos(x) / x
+        y[1] = -np.cos(x) / x ** 2 - np.sin(x) / x
+    for n in range(2, order + 1):
+        j[n] = (2 * n - 1) / x * j[n - 1] - j[n - 2]
+        y[n] = (2 * n - 1) / x * y[n - 1] - y[n - 2]
+
+    # Upward recurrence of j_n is unstable below x ~ n, use the series there
+    for n in range(order + 1):
+        small = x < n + 2
+        if(not np.any(small)):
+            continue
+        xs = x[small]
+        term = xs ** n / np.prod(np.arange(1, 2 * n + 2, 2, dtype=float))
+        total = term.copy()
+        for k in range(1, 60):
+            term = term * (-xs ** 2 / 2.0) / (k * (2 * n + 2 * k + 1))
+            total += term
+        j[n][small] = total
+    return j, y
+
+
+def modalStrength(order, kr, sphere="rigid"):
+    # Normalized (b_0 -> 1 at low frequencies) - (order + 1, ...)
+    if(sphere not in ["rigid", "open"]):
+        raise SOFAError("Sphere must either be 'rigid' or 'open'")
+    kr = np.maximum(np.asarray(kr, dtype=float), 1e-9)
+    j, y = sphericalBessel(order + 1, kr)
+    n = np.arange(order + 1).reshape((-1,) + (1,) * kr.ndim)
+    phase = 1j ** n
+    if(sphere == "open"):
+        return phase * j[:-1]
+    jd = n / kr * j[:-1] - j[1:]
+    yd = n / kr * y[:-1] - y[1:]
+    h = j[:-1] - 1j * y[:-1]
+    hd = jd - 1j * yd
+    return phase * (j[:-1] - jd / hd * h)
+
+
+def radialFilters(order, radius, samplingRate, length=512, sphere="rigid",
+                  maxGain=20.0, speedOfSound=343.0):
+    # Tikhonov-limited inverse of the modal strength, linear phase FIR
+    frequencies = np.fft.rfftfreq(length, 1.0 / samplingRate)
+    kr = 2 * np.pi * frequencies / speedOfSound * radius
+    strength = modalStrength(order, kr, sphere)
+    limit = 1.0 / (4 * (10 ** (maxGain / 20.0)) ** 2)
+    response = np.conj(strength) / (np.abs(strength) ** 2 + limit)
+    filters = np.roll(np.fft.irfft(response, length, axis=-1), length // 2,
+                      axis=-1)
+    return filters * np.hanning(length + 2)[1:-1]
+
+
+class SOFAAmbisonicEncoder(object):
+    def __init__(self, sofa, order=None, radius=None, sphere="rigid",
+                 regularization=1e-2, maxGain=20.0, filterLength=512,
+                 normalization="sn3d", speedOfSound=343.0):
+        if(sphere not in [None, "rigid", "open"]):
+            raise SOFAError("Sphere must either be 'rigid', 'open' or None")
+        self.sofa = sofa
+        self.ir = getImpulseResponses(sofa)
+        if(self.ir.ndim != 3):
+            raise SOFAError(("Encoding requires 'Data.IR' with dimensions "
+                             "MRN. You supplied: {}").format(self.ir.shape))
+        receivers = self.ir.shape[1]
+        self.order = int(np.sqrt(receivers)) - 1 if order is None\
+            else int(order)
+        if(self.order < 0 or (self.order + 1) ** 2 > receivers):
+            raise SOFAError("Order {} requires at least {} receivers"
+                            .format(self.order, (self.order + 1) ** 2))
+        self.channels = (self.order + 1) ** 2
+        self.sphere = sphere
+        self.regularization = float(regularization)
+        self.maxGain = float(maxGain)
+        self.filterLength = int(filterLength)
+        self.normalization = normalization
+        self.speedOfSound = float(speedOfSound)
+        self.samplingRate = float(np.ravel(
+                sofa.getParam("Data.SamplingRate"))[0])
+        self.radius = np.mean(np.linalg.norm(self.positions(), axis=-1))\
+            if radius is None else float(radius)
+
+    def positions(self):
+        positions = np.asarray(self.sofa.getParam("ReceiverPosition"),
+                               dtype=float)
+        if(positions.ndim == 3):
+            if(not np.allclose(positions, positions[:, :, :1])):
+                raise SOFAError("Receiver positions must not change "
+                                "between measurements")
+            positions = positions[:, :, 0]
+        if(self.sofa.getParam("ReceiverPosition:Type").lower() ==
+                "spherical"):
+            positions = sphericalToCartesian(positions)
+        return positions
+
+    @property
+    def latency(self):
+        return self.filterLength // 2 if self.sphere else 0
+
+    @property
+    def matrix(self):
+        # Regularized least-squares fit of the harmonics - (Q, R)
+        def compute():
+            harmonics = sphericalHarmonics(self.order, self.positions(),
+                                           self.normalization)
+            gram = np.dot(harmonics.T, harmonics)
+            scale = self.regularization * np.trace(gram) / self.channels
+            return np.linalg.solve(gram + scale * np.eye(self.channels),
+                                   harmonics.T)
+        key = ("matrix", self.order, self.regularization, self.normalization)
+        return self.sofa.cached("ambisonicsMatrix", key,
+                                ["ReceiverPosition", "ReceiverPosition:Type"],
+                                compute)
+
+    @property
+    def filters(self):
+        # Radial filter of every channel - (Q, T)
+        def compute():
+            filters = radialFilters(self.order, self.radius,
+                                    self.samplingRate, self.filterLength,
+                                    self.sphere, self.maxGain,
+                                    self.speedOfSound)
+            degrees = np.repeat(np.arange(self.order + 1),
+                                2 * np.arange(self.order + 1) + 1)
+            return filters[degrees]
+        key = ("filters", self.order, self.radius, self.samplingRate,
+               self.filterLength, self.sphere, self.maxGain,
+               self.speedOfSound)
+        return self.sofa.cached("ambisonicsFilters", key,
+                                ["ReceiverPosition"], compute)
+
+    def encode(self, chunk=None):
+        # Ambisonic impulse responses, latency compensated - (M, Q, N)
+        measurements, _, length = self.ir.shape
+        matrix = self.matrix
+        if(not self.sphere):
+            return np.einsum("qr,mrn->mqn", matrix, self.ir)
+
+        chunk = length if chunk is None else max(int(chunk), 1)
+        taps = self.filterLength
+        nfft = 1 << int(np.ceil(np.log2(chunk + taps - 1)))
+        spectra = np.fft.rfft(self.filters, nfft, axis=-1)
+
+        # Overlap-add of the radial filters over blocks along N
+        output = np.zeros((measurements, self.channels, length + taps - 1))
+        for start in range(0, length, chunk):
+            block = self.ir[:, :, start:start + chunk]
+            encoded = np.einsum("qr,mrn->mqn", matrix, block)
+            filtered = np.fft.irfft(np.fft.rfft(encoded, nfft, axis=-1) *
+                                    spectra, nfft, axis=-1)
+            size = min(block.shape[-1] + taps - 1, output.shape[-1] - start)
+            output[:, :, start:start + size] += filtered[:, :, :size]
+        return output[:, :, self.latency:self.latency + length]
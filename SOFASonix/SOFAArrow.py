@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAArrow.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import json
+import numpy as np
+from .SOFAProcessing import measurementAxis
+from .SOFASonixError import SOFAError
+
+# Target size of a row group (or record batch) along M
+ROW_GROUP_BYTES = 1 << 26
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise SOFAError("Arrow/Parquet export requires pyarrow. Please "
+                        "install it with 'pip install pyarrow'.")
+
+
+def measurementColumns(sofa, data=False, keys=None):
+    # Per-measurement arrays (M, ...) of variables that have an M variant.
+    # I-dimensioned values of such variables are repeated for every row.
+    measurements = sofa.getDim("M")
+    columns, constants = {}, {}
+    for key, field in sorted(sofa.flatten().items()):
+        if(not field.isType("double") or field.isEmpty()):
+            continue
+        value = np.asarray(field.value, dtype=float)
+        axis = measurementAxis(field, measurements)
+        variant = any("m" in d.lower() for d in field.dimensions or [])
+        if(axis is None and variant):
+            for dims in field.dimensions:
+                if(len(dims) == value.ndim and "i" in dims.lower()):
+                    axis = dims.lower().index("i")
+                    value = np.repeat(value, measurements, axis=axis)
+                    break
+        bulk = key.startswith("Data.") and value.ndim > 2
+        selected = key in keys if keys is not None else (data or not bulk)
+        if(axis is None):
+            constants[key] = value.tolist()
+        elif(selected):
+            columns[key] = np.moveaxis(value, axis, 0)
+    return columns, constants
+
+
+def _schema(pa, sofa, columns, constants):
+    params = sofa.flatten()
+    fields = [pa.field("measurement", pa.int64())]
+    for key, value in columns.items():
+        size = int(np.prod(value.shape[1:]))
+        metadata = {"shape": json.dumps(list(value.shape[1:]))}
+        for name, attribute in params.items():
+            if(name.startswith("{}:".format(key)) and
+               attribute.isType("attribute") and attribute.value):
+                metadata[name.split(":", 1)[1]] = str(attribute.value)
+        fields.append(pa.field(key, pa.list_(pa.float64(), size),
+                               metadata=metadata))
+
+    # Global attributes and measurement-independent values as metadata
+    metadata = {k: str(v.value) for k, v in params.items()
+                if k.startswith("GLOBAL:") and v.value}
+    metadata["SOFA:Dimensions"] = json.dumps(
+            {k: v["value"] for k, v in sofa.dims.items()})
+    metadata["SOFA:Variables"] = json.dumps(constants)
+    return pa.schema(fields, metadata=metadata)
+
+
+def recordBatches(sofa, data=False, keys=None, rowGroupSize=None):
+    pa = _pyarrow()
+    columns, constants = measurementColumns(sofa, data, keys)
+    schema = _schema(pa, sofa, columns, constants)
+    measurements = sofa.getDim("M")
+    rowBytes = sum(v[0].nbytes for v in columns.values()) + 8
+    rows = int(rowGroupSize) if rowGroupSize else\
+        max(ROW_GROUP_BYTES // rowBytes, 1)
+
+    def batches():
+        for start in range(0, measurements, rows):
+            part = slice(start, min(start + rows, measurements))
+            arrays = [pa.array(np.arange(part.start, part.stop))]
+            for key, value in columns.items():
+                flat = np.ascontiguousarray(value[part]).reshape(
+                        part.stop - part.start, -1)
+                arrays.append(pa.FixedSizeListArray.from_arrays(
+                        pa.array(flat.ravel()), flat.shape[1]))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+    return schema, batches()
+
+
+def exportParquet(sofa, path, data=False, keys=None, rowGroupSize=None,
+                  compression="snappy"):
+    # One row group per block of measurements
+    _pyarrow()
+    import pyarrow.parquet as pq
+    schema, batches = recordBatches(sofa, data, keys, rowGroupSize)
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def exportArrow(sofa, path, data=False, keys=None, rowGroupSize=None):
+    # Arrow IPC file with one record batch per block of measurements
+    pa = _pyarrow()
+    schema, batches = recordBatches(sofa, data, keys, rowGroupSize)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAAsync.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import os
+import threading
+from .SOFASonix import SOFASonix
+from .SOFASonixError import SOFAError
+
+
+class SOFAIOExecutor(object):
+    # File access is serialized between threads of one process, so
+    # processes=True is required for parallel decoding
+    def __init__(self, workers=8, perDevice=2, processes=False):
+        if(int(workers) < 1 or int(perDevice) < 1):
+            raise SOFAError("Worker limits must be positive")
+        self.workers = int(workers)
+        self.perDevice = int(perDevice)
+        self.processes = processes
+        self.executor = None
+        self.pool = None
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def _executor(self):
+        with self.lock:
+            if(self.executor is None):
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def _pool(self):
+        with self.lock:
+            if(self.pool is None):
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Forking from a worker thread could copy a held IO_LOCK or
+                # HDF5 state into the child, so workers are spawned instead
+                self.pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def _semaphore(self, path):
+        # Files that do not exist yet are limited by their directory
+        path = os.path.abspath(path)
+        while(not os.path.exists(path) and os.path.dirname(path) != path):
+            path = os.path.dirname(path)
+        device = os.stat(path).st_dev
+        with self.lock:
+            if(device not in self.devices):
+                self.devices[device] = threading.BoundedSemaphore(
+                        self.perDevice)
+            return self.devices[device]
+
+    def _run(self, semaphore, cancelled, function, args):
+        with semaphore:
+            # Skip work that was cancelled while waiting for the device
+            if(cancelled.is_set()):
+                return None
+            if(self.processes):
+                return self._pool().submit(function, *args).result()
+            return function(*args)
+
+    def submit(self, path, function, args=(), timeout=None):
+        # Returns an awaitable, I/O runs on the executor threads
+        import asyncio
+        loop = asyncio.get_event_loop()
+        cancelled = threading.Event()
+        future = loop.run_in_executor(self._executor(), self._run,
+                                      self._semaphore(path), cancelled,
+                                      function, args)
+
+        def done(result):
+            if(result.cancelled()):
+                cancelled.set()
+        future.add_done_callback(done)
+        if(timeout is not None):
+            return asyncio.wait_for(future, timeout)
+        return future
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            if(self.executor is not None):
+                self.executor.shutdown(wait)
+                self.executor = None
+            if(self.pool is not None):
+                self.pool.shutdown(wait)
+                self.pool = None
+
+
+EXECUTOR = SOFAIOExecutor()
+
+
+def aload(file, verbose=False, timeout=None, executor=None):
+    executor = executor or EXECUTOR
+    return executor.submit(file, SOFASonix.load, (file, verbose), timeout)
+
+
+def aexport(sofa, filename, timeout=None, executor=None):
+    # A write that has already started runs to completion when cancelled
+    executor = executor or EXECUTOR
+    return executor.submit("{}.sofa".format(filename), sofa.export,
+                           (filename,), timeout)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFACache.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import os
+import threading
+from collections import OrderedDict
+from .SOFASonix import SOFASonix
+
+
+class SOFACache(object):
+    # Objects are shared between callers and must be treated as read-only
+    def __init__(self, maxBytes=1 << 30, verbose=False):
+        self.maxBytes = int(maxBytes)
+        self.verbose = verbose
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return (stat.st_mtime, stat.st_size)
+
+    @property
+    def bytes(self):
+        return sum(entry["bytes"] for entry in self.entries.values())
+
+    def _lookup(self, path, stamp):
+        # Must be called with the lock held
+        entry = self.entries.pop(path, None)
+        if(entry is not None and entry["stamp"] == stamp):
+            self.hits += 1
+            self.entries[path] = entry
+            return entry["sofa"]
+        return None
+
+    def get(self, path):
+        path = os.path.realpath(path)
+        stamp = self._stamp(path)
+        with self.lock:
+            sofa = self._lookup(path, stamp)
+            if(sofa is not None):
+                return sofa
+            pending = self.loading.setdefault(path, threading.Lock())
+
+        # Only one caller loads a given path, the others wait for it
+        with pending:
+            with self.lock:
+                sofa = self._lookup(path, stamp)
+                if(sofa is not None):
+                    return sofa
+                self.misses += 1
+            try:
+                sofa = SOFASonix.load(path, verbose=self.verbose)
+                size = sofa.memoryUsage()
+                with self.lock:
+                    # Objects exceeding the whole budget are not retained
+                    if(size <= self.maxBytes):
+                        self.entries[path] = {"stamp": stamp, "sofa": sofa,
+                                              "bytes": size}
+                        self._evict()
+            finally:
+                with self.lock:
+                    self.loading.pop(path, None)
+        return sofa
+
+    def _evict(self):
+        # Derived caches (spectra, cues) grow after insertion, re-measure
+        for entry in self.entries.values():
+            entry["bytes"] = entry["sofa"].memoryUsage()
+        total = self.bytes
+        while(total > self.maxBytes and self.entries):
+            _, entry = self.entries.popitem(last=False)
+            total -= entry["bytes"]
+            self.evictions += 1
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if(path is None):
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.realpath(path), None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "entries": len(self.entries),
+                    "bytes": self.bytes, "maxBytes": self.maxBytes}
+
+    def __contains__(self, path):
+        return os.path.realpath(path) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFACatalog.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import netCDF4
+from .SOFASonix import IO_LOCK
+from .SOFASonixError import SOFAError
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    hash TEXT,
+    convention TEXT,
+    conventionVersion TEXT,
+    version TEXT,
+    listener TEXT,
+    database TEXT,
+    organization TEXT,
+    M INTEGER,
+    R INTEGER,
+    E INTEGER,
+    N INTEGER,
+    dimensions TEXT,
+    attributes TEXT,
+    variables TEXT,
+    indexed REAL,
+    error TEXT
+)"""
+COLUMNS = ["path", "mtime", "size", "hash", "convention",
+           "conventionVersion", "version", "listener", "database",
+           "organization", "M", "R", "E", "N", "dimensions", "attributes",
+           "variables", "indexed", "error"]
+JSON = ["dimensions", "attributes", "variables"]
+
+
+def fileHash(path, blockSize=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def readMetadata(path):
+    # Header only, no variable data is decoded
+    with IO_LOCK:
+        raw = netCDF4.Dataset(path, "r", "NETCDF4")
+        try:
+            attributes = {a: str(getattr(raw, a)) for a in raw.ncattrs()}
+            dimensions = {d: len(raw.dimensions[d]) for d in raw.dimensions}
+            variables = {v: list(raw[v].shape) for v in raw.variables}
+        finally:
+            raw.close()
+    if("SOFAConventions" not in attributes):
+        raise SOFAError("Invalid SOFA file. No convention specified.")
+    return {"convention": attributes.get("SOFAConventions"),
+            "conventionVersion": attributes.get("SOFAConventionsVersion"),
+            "version": attributes.get("Version"),
+            "listener": attributes.get("ListenerShortName"),
+            "database": attributes.get("DatabaseName"),
+            "organization": attributes.get("Organization"),
+            "M": dimensions.get("M"), "R": dimensions.get("R"),
+            "E": dimensions.get("E"), "N": dimensions.get("N"),
+            "dimensions": dimensions, "attributes": attributes,
+            "variables": variables}
+
+
+def indexFile(path, mtime, size):
+    row = {column: None for column in COLUMNS}
+    row.update({"path": path, "mtime": mtime, "size": size,
+                "indexed": time.time()})
+    try:
+        row.update(readMetadata(path))
+        row["hash"] = fileHash(path)
+    except Exception as e:
+        row["error"] = "{}: {}".format(type(e).__name__, e)
+    return row
+
+
+class SOFACatalog(object):
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def scan(self, paths, workers=None, prune=True):
+        from .SOFACommand import collect
+        files = [os.path.abspath(path) for path, _ in collect(paths)]
+        known = {row[0]: (row[1], row[2]) for row in self.db.execute(
+                "SELECT path, mtime, size FROM files")}
+
+        # Only new or modified files are read
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0,
+                 "failed": 0}
+        pending = []
+        for path in files:
+            stat = os.stat(path)
+            if(known.get(path) == (stat.st_mtime, stat.st_size)):
+                stats["unchanged"] += 1
+            else:
+                pending.append((path, stat.st_mtime, stat.st_size))
+
+        if(workers and int(workers) > 1 and len(pending) > 1):
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=int(workers)) as pool:
+                rows = list(pool.map(lambda task: indexFile(*task),
+                                     pending))
+        else:
+            rows = [indexFile(*task) for task in pending]
+
+        for row in rows:
+            stats["updated" if row["path"] in known else "added"] += 1
+            stats["failed"] += row["error"] is not None
+            values = [json.dumps(row[c]) if c in JSON and row[c] is not None
+                      else row[c] for c in COLUMNS]
+            self.db.execute("INSERT OR REPLACE INTO files ({}) VALUES ({})"
+                            .format(", ".join(COLUMNS),
+                                    ", ".join("?" * len(COLUMNS))), values)
+
+        # Forget files that disappeared below the scanned directories
+        if(prune):
+            roots = [os.path.join(os.path.abspath(p), "")
+                     for p in paths if os.path.isdir(p)]
+            current = set(files)
+            for path in known:
+                if(path not in current and
+                   any(path.startswith(root) for root in roots)):
+                    self.db.execute("DELETE FROM files WHERE path = ?",
+                                    (path,))
+                    stats["removed"] += 1
+        self.db.commit()
+        return stats
+
+    def query(self, limit=None, **filters):
+        # Exact matches, '%' wildcards for strings, (low, high) ranges
+        clauses, values = [], []
+        for column, value in filters.items():
+            if(column not in COLUMNS):
+                raise SOFAError("Unknown catalog column '{}'".format(column))
+            if(isinstance(value, (tuple, list))):
+                low, high = value
+                if(low is not None):
+                    clauses.append("{} >= ?".format(column))
+                    values.append(low)
+                if(high is not None):
+                    clauses.append("{} <= ?".format(column))
+                    values.append(high)
+            elif(value is None):
+                clauses.append("{} IS NULL".format(column))
+            elif(isinstance(value, str) and "%" in value):
+                clauses.append("{} LIKE ?".format(column))
+                values.append(value)
+            else:
+                clauses.append("{} = ?".format(column))
+                values.append(value)
+        query = "SELECT {} FROM files".format(", ".join(COLUMNS))
+        if(clauses):
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY path"
+        if(limit is not None):
+            query += " LIMIT {}".format(int(limit))
+
+        results = []
+        for row in self.db.execute(query, values):
+            entry = dict(zip(COLUMNS, row))
+            for column in JSON:
+                if(entry[column] is not None):
+                    entry[column] = json.loads(entry[column])
+            results.append(entry)
+        return results
+
+    def duplicates(self):
+        # Files sharing identical content
+        groups = {}
+        for path, digest in self.db.execute(
+                "SELECT path, hash FROM files WHERE hash IN (SELECT hash "
+                "FROM files WHERE hash IS NOT NULL GROUP BY hash HAVING "
+                "COUNT(*) > 1) ORDER BY hash, path"):
+            groups.setdefault(digest, []).append(path)
+        return list(groups.values())
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
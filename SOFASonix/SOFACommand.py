@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFACommand.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+
+SUFFIX = ".sofa"
+
+
+def collect(paths):
+    # SOFA files below the given paths with their tree-relative names
+    files = []
+    for path in paths:
+        if(os.path.isdir(path)):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if(name.lower().endswith(SUFFIX)):
+                        full = os.path.join(root, name)
+                        files.append((full, os.path.relpath(full, path)))
+        elif(os.path.isfile(path)):
+            files.append((path, os.path.basename(path)))
+        else:
+            raise IOError("No such file or directory: '{}'".format(path))
+    return files
+
+
+def describe(sofa, path):
+    params = sofa.flatten()
+    attributes = {}
+    for name in ["Title", "DatabaseName", "ListenerShortName",
+                 "Organization", "DateModified"]:
+        key = "GLOBAL:{}".format(name)
+        if(key in params):
+            attributes[name] = str(params[key].value)
+    return {"convention": sofa.convention["name"],
+            "conventionVersion": sofa.convention["SOFAConventionsVersion"],
+            "version": sofa.convention["spec_version"],
+            "bytes": os.path.getsize(path),
+            "dimensions": {k: v["value"] for k, v in sofa.dims.items()},
+            "attributes": attributes,
+            "variables": {k: list(np.shape(v.value))
+                          for k, v in params.items()
+                          if v.isType("double") or v.isType("string")}}
+
+
+def processFile(task):
+    # Runs in a worker process, failures are reported rather than raised
+    from .SOFASonix import SOFASonix
+    started = time.time()
+    result = {"path": task["path"]}
+    try:
+        sofa = SOFASonix.load(task["path"], verbose=False)
+        command, options = task["command"], task["options"]
+        if(command == "info"):
+            result.update(describe(sofa, task["path"]))
+        elif(command == "validate"):
+            sofa.validate()
+        else:
+            if(command == "convert-format"):
+                from .SOFAConverter import convert, FIR_TO_TF
+                # Only FIR to TF takes nfft, the other conversions a length
+                accepted = ["nfft"] if sofa.convention["name"] in FIR_TO_TF\
+                    else ["length"]
+                arguments = {k: options[k] for k in accepted
+                             if options.get(k)}
+                sofa = convert(sofa, options["convention"], **arguments)
+            elif(command == "resample"):
+                sofa.resample(options["rate"])
+            output = task["output"]
+            if(not os.path.isdir(os.path.dirname(output) or ".")):
+                try:
+                    os.makedirs(os.path.dirname(output))
+                except OSError:
+                    pass
+            sofa.export(output, compression=options.get("level"))
+            result["output"] = "{}{}".format(output, SUFFIX)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["elapsed"] = time.time() - started
+    return result
+
+
+def batchCommand(arguments):
+    files = collect(arguments.paths)
+    writes = arguments.command not in ["info", "validate"]
+    if(writes and not arguments.output):
+        raise SystemExit("{} requires --output".format(arguments.command))
+
+    options = {k: getattr(arguments, k, None)
+               for k in ["convention", "nfft", "length", "rate", "level"]}
+    tasks = []
+    for path, relative in files:
+        output = None
+        if(writes):
+            output = os.path.join(arguments.output,
+                                  os.path.splitext(relative)[0])
+        tasks.append({"command": arguments.command, "path": path,
+                      "output": output, "options": options})
+
+    started = time.time()
+    results = []
+
+    def report(result):
+        results.append(result)
+        if(not arguments.quiet):
+            sys.stderr.write("[{}/{}] {} {} ({:.2f}s){}\n".format(
+                    len(results), len(tasks), result["status"],
+                    result["path"], result["elapsed"],
+                    ": " + result["error"] if "error" in result else ""))
+            sys.stderr.flush()
+
+    workers = arguments.workers or multiprocessing.cpu_count()
+    if(workers > 1 and len(tasks) > 1):
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(processFile, task)
+                                        for task in tasks]):
+                report(future.result())
+    else:
+        for task in tasks:
+            report(processFile(task))
+
+    results.sort(key=lambda r: r["path"])
+    failed = sum(r["status"] != "ok" for r in results)
+    summary = {"command": arguments.command, "files": len(results),
+               "succeeded": len(results) - failed, "failed": failed,
+               "workers": workers, "elapsed": time.time() - started,
+               "results": results}
+    if(arguments.summary == "-"):
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif(arguments.summary):
+        with open(arguments.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    if(not arguments.quiet):
+        sys.stderr.write("{} file(s), {} failed in {:.2f}s\n".format(
+                summary["files"], failed, summary["elapsed"]))
+    return 1 if failed else 0
+
+
+def serveCommand(arguments):
+    from .SOFAServer import serve
+    print("Serving {} file(s) on http://{}:{}".format(
+            len(arguments.files), arguments.host, arguments.port))
+    serve(arguments.files, arguments.host, arguments.port,
+          cacheSize=arguments.cache_size,
+          batchWindow=arguments.batch_window / 1000.0,
+          maxNeighbours=arguments.max_neighbours,
+          verbose=arguments.verbose)
+    return 0
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+            prog="sofasonix",
+            description="Command line tools for SOFA files")
+    commands = parser.add_subparsers(dest="command")
+
+    serve = commands.add_parser(
+            "serve", help="Keep SOFA files resident and answer batched "
+            "direction queries over HTTP")
+    serve.add_argument("files", nargs="+", help="SOFA files to serve")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8470)
+    serve.add_argument("--cache-size", type=int, default=4096,
+                       help="Number of cached responses")
+    serve.add_argument("--batch-window", type=float, default=2.0,
+                       help="Time to collect concurrent requests (ms)")
+    serve.add_argument("--max-neighbours", type=int, default=8)
+    serve.add_argument("--verbose", action="store_true")
+    serve.set_defaults(function=serveCommand)
+
+    # Directory-scale batch commands
+    batch = argparse.ArgumentParser(add_help=False)
+    batch.add_argument("paths", nargs="+",
+                       help="SOFA files or directories (searched "
+                       "recursively)")
+    batch.add_argument("--workers", type=int, default=None,
+                       help="Worker processes (default: all cores)")
+    batch.add_argument("--summary", default=None,
+                       help="Write a JSON summary to a file ('-' for "
+                       "stdout)")
+    batch.add_argument("--quiet", action="store_true",
+                       help="Do not report progress")
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--output", "-o", required=True,
+                        help="Output directory mirroring the input tree")
+
+    commands.add_parser("info", parents=[batch],
+                        help="Summarize conventions, dimensions and "
+                        "variables").set_defaults(function=batchCommand)
+    commands.add_parser("validate", parents=[batch],
+                        help="Check files against their conventions"
+                        ).set_defaults(function=batchCommand)
+    convert = commands.add_parser("convert-format", parents=[batch, output],
+                                  help="Convert between FIR, TF and SOS "
+                                  "conventions")
+    convert.add_argument("--convention", required=True,
+                         help="Target convention")
+    convert.add_argument("--nfft", type=int, default=None)
+    convert.add_argument("--length", type=int, default=None)
+    convert.add_argument("--level", type=int, default=None,
+                         help="zlib compression level (1-9) of the output")
+    convert.set_defaults(function=batchCommand)
+    recompress = commands.add_parser("recompress", parents=[batch, output],
+                                     help="Rewrite files with a different "
+                                     "compression level")
+    recompress.add_argument("--level", type=int, default=4,
+                            help="zlib compression level (1-9) of the "
+                            "output (default: 4)")
+    recompress.set_defaults(function=batchCommand)
+    resample = commands.add_parser("resample", parents=[batch, output],
+                                   help="Change the sampling rate of "
+                                   "Data.IR")
+    resample.add_argument("--rate", type=float, required=True,
+                          help="Target sampling rate (Hz)")
+    resample.add_argument("--level", type=int, default=None,
+                          help="zlib compression level (1-9) of the output")
+    resample.set_defaults(function=batchCommand)
+    return parser
+
+
+def main(argv=None):
+    arguments = parser().parse_args(argv)
+    if(not getattr(arguments, "function", None)):
+        parser().print_help()
+        return 1
+    return arguments.function(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFACompare.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+import pandas as pd
+from .SOFACues import SOFACues
+from .SOFADSP import chunks
+from .SOFAProcessing import getImpulseResponses
+from .SOFASpatial import SOFASpatialIndex, getDirections
+from .SOFASonixError import SOFAError
+
+
+class SOFAComparison(object):
+    def __init__(self, measurements, maxAngle=None):
+        self.measurements = measurements
+        self.maxAngle = maxAngle
+
+    def summary(self):
+        columns = [c for c in self.measurements.columns
+                   if c not in ["measurement", "reference", "matched"]]
+        values = self.measurements
+        # Rows without a reference within maxAngle are not comparable
+        if("matched" in values.columns):
+            values = values[values["matched"]]
+        values = values[columns]
+        return pd.DataFrame({"mean": values.mean(),
+                             "median": values.median(),
+                             "p95": values.quantile(0.95),
+                             "max": values.abs().max()})
+
+    def __repr__(self):
+        return str(self.summary())
+
+
+def _levels(ir):
+    energy = np.einsum("...n,...n->...", ir, ir)
+    return 10 * np.log10(np.maximum(energy, 1e-300))
+
+
+def compare(reference, test, nfft=None, frequencyRange=(20.0, 20000.0),
+            maxAngle=None, itd="xcorr", workers=None, chunk=1024):
+    refIR = getImpulseResponses(reference)
+    testIR = getImpulseResponses(test)
+    rate = float(np.ravel(reference.getParam("Data.SamplingRate"))[0])
+    if(rate != float(np.ravel(test.getParam("Data.SamplingRate"))[0])):
+        raise SOFAError("Sampling rates differ. Please resample one of the "
+                        "objects first.")
+    if(refIR.shape[1:-1] != testIR.shape[1:-1]):
+        raise SOFAError("Receiver layouts differ: {} and {}"
+                        .format(refIR.shape[1:-1], testIR.shape[1:-1]))
+
+    # Align every test measurement with its nearest reference direction
+    index = SOFASpatialIndex(getDirections(reference))
+    angles, pairs = index.query(getDirections(test), 1)
+    angles, pairs = np.degrees(angles[:, 0]), pairs[:, 0]
+
+    nfft = max(refIR.shape[-1], testIR.shape[-1]) if nfft is None\
+        else int(nfft)
+    frequencies = np.fft.rfftfreq(nfft, 1.0 / rate)
+    band = (frequencies >= frequencyRange[0]) &\
+        (frequencies <= frequencyRange[1])
+    if(not np.any(band)):
+        raise SOFAError("No frequency bins within {}".format(frequencyRange))
+    refSpectra = reference.spectrum(nfft, magnitude=True)
+    testSpectra = test.spectrum(nfft, magnitude=True)
+
+    def evaluate(part):
+        # Log-spectral distortion and level difference for a block of pairs
+        ratio = np.log10(np.maximum(testSpectra[part][..., band], 1e-300) /
+                         np.maximum(refSpectra[pairs[part]][..., band],
+                                    1e-300)) * 20
+        distortion = np.sqrt(np.mean(ratio ** 2, axis=-1))
+        level = _levels(testIR[part]) - _levels(refIR[pairs[part]])
+        return part, distortion, level
+
+    parts = list(chunks(testIR.shape[0], chunk))
+    if(workers and int(workers) > 1 and len(parts) > 1):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=int(workers)) as pool:
+            results = list(pool.map(evaluate, parts))
+    else:
+        results = [evaluate(part) for part in parts]
+
+    distortion = np.empty(testIR.shape[:-1])
+    level = np.empty(testIR.shape[:-1])
+    for part, d, l in results:
+        distortion[part] = d
+        level[part] = l
+
+    # Flatten receivers (and emitters) into columns
+    receivers = int(np.prod(testIR.shape[1:-1]))
+    columns = {"measurement": np.arange(testIR.shape[0]),
+               "reference": pairs,
+               "angularError": angles}
+    for i, values in enumerate(distortion.reshape(-1, receivers).T):
+        columns["lsd{}".format(i)] = values
+    for i, values in enumerate(level.reshape(-1, receivers).T):
+        columns["levelDifference{}".format(i)] = values
+
+    if(itd and testIR.shape[1] >= 2):
+        difference = SOFACues(test).itd(itd) -\
+            SOFACues(reference).itd(itd)[pairs]
+        difference = difference.reshape(testIR.shape[0], -1) * 1e6
+        for i, values in enumerate(difference.T):
+            name = "itdDifference" if difference.shape[1] == 1 else\
+                "itdDifference{}".format(i)
+            columns[name] = values
+    if(maxAngle is not None):
+        columns["matched"] = angles <= maxAngle
+
+    return SOFAComparison(pd.DataFrame(columns), maxAngle)
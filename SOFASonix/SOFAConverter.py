@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAConverter.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFASonix import SOFASonix
+from .SOFADSP import (chunks, broadcastDelay, sosImpulseResponse,
+                      sosFrequencyResponse, sosLength)
+from .SOFASonixError import SOFAError
+
+# Convention pairs that can be converted into each other
+FIR_TO_TF = {"SimpleFreeFieldHRIR": "SimpleFreeFieldTF",
+             "GeneralFIR": "GeneralTF"}
+TF_TO_FIR = {v: k for k, v in FIR_TO_TF.items()}
+SOS_TO_FIR = {"SimpleFreeFieldSOS": "SimpleFreeFieldHRIR"}
+
+
+def transfer(source, target, skip=()):
+    # Copy dimensions that are writable in the target
+    for dim, spec in source.dims.items():
+        if(dim in target.dims and not target.dims[dim]["ro"] and
+           dim not in skip):
+            target.setDim(dim, spec["value"])
+
+    targetParams = target.flatten()
+    for key, field in source.flatten().items():
+        root = key.split(":")[0].split(".")[0]
+        if(key in skip or root in skip or field.isEmpty()):
+            continue
+        if(key in targetParams):
+            param = targetParams[key]
+            if(param.isReadOnly() or field.type != param.type):
+                continue
+            # Assign directly, values have already been validated
+            param.value = np.copy(field.value) if\
+                field.isType("double") or field.isType("string") else\
+                field.value
+            if(field.isType("string")):
+                param.paddedValue = np.copy(field.paddedValue)
+        elif(field.inClass("__unclassed")):
+            # Carry over foreign variables not tied to skipped dimensions
+            dims = "".join(field.dimensions or [""]).upper()
+            if(any([d in dims for d in skip])):
+                continue
+            target.setParam(key, np.copy(field.value) if
+                            field.isType("double") else field.value,
+                            force=True)
+            if(not field.isType("attribute")):
+                target.getParam(key, True).dimensions = field.dimensions
+    target.modified = source.modified
+    return target
+
+
+def _target(sofa, conversions, convention):
+    name = sofa.convention["name"]
+    if(name not in conversions):
+        raise SOFAError("Cannot convert '{}'. Supported conventions:\n\n- {}"
+                        .format(name, "\n- ".join(sorted(conversions))))
+    convention = convention or conversions[name]
+    if(convention != conversions[name]):
+        raise SOFAError("'{}' can only be converted to '{}'"
+                        .format(name, conversions[name]))
+    return SOFASonix(convention, verbose=sofa.verbose)
+
+
+def toTransferFunction(sofa, nfft=None, chunk=None, convention=None):
+    target = _target(sofa, FIR_TO_TF, convention)
+    ir = sofa.getParam("Data.IR")
+    rate = float(np.ravel(sofa.getParam("Data.SamplingRate"))[0])
+
+    # Broadcast delays (IR or MR, in samples) to every measurement
+    delay = broadcastDelay(sofa.getParam("Data.Delay"), ir.shape[:-1])
+
+    # Delays become a circular phase shift, the transform must be long
+    # enough to hold the delayed response without wrapping its tail
+    required = ir.shape[-1] + int(np.ceil(max(np.max(delay), 0)))
+    nfft = required if nfft is None else int(nfft)
+    if(nfft < required):
+        raise SOFAError(("nfft ({}) must not be shorter than N plus the "
+                         "largest delay ({})").format(nfft, required))
+    # Odd transform lengths cannot be told apart from the bins alone, pad
+    # to an even length (lossless) so the inverse recovers the grid
+    nfft += nfft % 2
+    frequencies = np.fft.rfftfreq(nfft, 1.0 / rate)
+    shift = -2j * np.pi * frequencies / rate
+
+    real = np.empty(ir.shape[:-1] + (frequencies.size,))
+    imag = np.empty_like(real)
+    for part in chunks(ir.shape[0], chunk):
+        spectra = np.fft.rfft(ir[part], nfft, axis=-1)
+        # Fold broadband delays into the phase
+        if(np.any(delay[part])):
+            spectra *= np.exp(delay[part][..., np.newaxis] * shift)
+        real[part] = spectra.real
+        imag[part] = spectra.imag
+        del spectra
+
+    transfer(sofa, target, skip=("N", "Data"))
+    target.setParam("N", frequencies)
+    target.setParam("Data.Real", real)
+    target.setParam("Data.Imag", imag)
+    return target
+
+
+def toImpulseResponse(sofa, length=None, samplingRate=None, chunk=None,
+                      convention=None):
+    target = _target(sofa, TF_TO_FIR, convention)
+    frequencies = np.ravel(sofa.getParam("N")).astype(float)
+    real = sofa.getParam("Data.Real")
+    imag = sofa.getParam("Data.Imag")
+
+    # Only uniform grids from 0 Hz can be inverted with an inverse rfft
+    step = np.diff(frequencies)
+    if(frequencies.size < 2 or frequencies[0] != 0 or
+       not np.allclose(step, step[0])):
+        raise SOFAError("Conversion requires frequency bins spaced uniformly"
+                        " from 0 Hz")
+    length = 2 * (frequencies.size - 1) if length is None else int(length)
+    if(length <= 0):
+        raise SOFAError("Length must be a positive integer")
+    # Bin k lies at k * rate / size for an inverse transform of this size
+    size = max(length, 2 * (frequencies.size - 1))
+    if(samplingRate is None):
+        samplingRate = step[0] * size
+
+    ir = np.empty(real.shape[:-1] + (length,))
+    for part in chunks(real.shape[0], chunk):
+        spectra = real[part] + 1j * imag[part]
+        ir[part] = np.fft.irfft(spectra, size, axis=-1)[..., :length]
+        del spectra
+
+    transfer(sofa, target, skip=("N", "Data"))
+    target.setParam("Data.IR", ir)
+    target.setParam("Data.SamplingRate", np.array([float(samplingRate)]))
+    target.setParam("Data.Delay", np.zeros((1,) + ir.shape[1:-1]))
+    return target
+
+
+def evaluateSections(sofa, length=None, frequencies=None, chunk=None):
+    sos = sofa.getParam("Data.SOS")
+    rate = float(np.ravel(sofa.getParam("Data.SamplingRate"))[0])
+    if(frequencies is not None):
+        result = np.empty(sos.shape[:-1] + (np.size(frequencies),),
+                          dtype=complex)
+        for part in chunks(sos.shape[0], chunk):
+            result[part] = sosFrequencyResponse(sos[part], frequencies, rate)
+        return result
+
+    length = sosLength(sos) if length is None else int(length)
+    result = np.empty(sos.shape[:-1] + (length,))
+    for part in chunks(sos.shape[0], chunk):
+        result[part] = sosImpulseResponse(sos[part], length)
+    return result
+
+
+def fromSecondOrderSections(sofa, length=None, chunk=None, convention=None):
+    target = _target(sofa, SOS_TO_FIR, convention)
+    ir = evaluateSections(sofa, length, chunk=chunk)
+
+    transfer(sofa, target, skip=("N", "Data"))
+    target.setParam("Data.IR", ir)
+    target.setParam("Data.SamplingRate",
+                    np.copy(sofa.getParam("Data.SamplingRate")))
+    target.setParam("Data.Delay", np.copy(sofa.getParam("Data.Delay")))
+    return target
+
+
+def convert(sofa, convention, **kwargs):
+    name = sofa.convention["name"]
+    if(name in FIR_TO_TF):
+        return toTransferFunction(sofa, convention=convention, **kwargs)
+    elif(name in TF_TO_FIR):
+        return toImpulseResponse(sofa, convention=convention, **kwargs)
+    elif(name in SOS_TO_FIR):
+        return fromSecondOrderSections(sofa, convention=convention, **kwargs)
+    raise SOFAError("No conversion available from '{}' to '{}'"
+                    .format(name, convention))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAConvolver.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFASonixError import SOFAError
+
+
+def partitionSpectra(filters, blockSize):
+    # Split filters (..., N) into partitions of blockSize samples
+    length = filters.shape[-1]
+    count = max(int(np.ceil(length / float(blockSize))), 1)
+    padded = np.zeros(filters.shape[:-1] + (count * blockSize,))
+    padded[..., :length] = filters
+    segments = padded.reshape(filters.shape[:-1] + (count, blockSize))
+
+    # Partition spectra with the partition index first - (P, ..., K)
+    return np.ascontiguousarray(np.moveaxis(
+            np.fft.rfft(segments, 2 * blockSize, axis=-1), -2, 0))
+
+
+class SOFAPartitionStage(object):
+    def __init__(self, spectra, blockSize, offset=0):
+        self.blockSize = blockSize
+        self.offset = offset
+        # Precomputed partition spectra - (P, R, E, K)
+        self.spectra = spectra
+        self.count = spectra.shape[0]
+        self.reset()
+
+    def reset(self):
+        emitters = self.spectra.shape[2]
+        bins = self.spectra.shape[-1]
+        # Sliding input window of two blocks for overlap-save
+        self.window = np.zeros((emitters, 2 * self.blockSize))
+        self.filled = 0
+        # Frequency-domain delay line, used as a ring buffer
+        self.fdl = np.zeros((self.count, emitters, bins), dtype=complex)
+        self.position = 0
+
+    def push(self, block):
+        size = block.shape[-1]
+        self.window[:, self.blockSize + self.filled:
+                    self.blockSize + self.filled + size] = block
+        self.filled += size
+        return self.filled == self.blockSize
+
+    def advance(self):
+        # Transform the latest input window and insert it into the FDL
+        self.position = (self.position - 1) % self.count
+        self.fdl[self.position] = np.fft.rfft(self.window, axis=-1)
+
+        # Slide the window for the next block
+        self.window[:, :self.blockSize] = self.window[:, self.blockSize:]
+        self.filled = 0
+
+    def aligned(self):
+        # Align FDL slots to partitions (newest spectrum -> partition 0)
+        order = (self.position + np.arange(self.count)) % self.count
+        return self.fdl[order]
+
+    def spectrum(self, spectra=None):
+        spectra = self.spectra if spectra is None else spectra
+        return np.einsum("prek,pek->rk", spectra, self.aligned())
+
+    def output(self, spectrum):
+        return np.fft.irfft(spectrum, 2 * self.blockSize,
+                            axis=-1)[..., self.blockSize:]
+
+    def compute(self):
+        self.advance()
+        return self.output(self.spectrum())
+
+
+class SOFAConvolver(object):
+    def __init__(self, sofa, measurement=0, blockSize=512, partitions=None):
+        try:
+            ir = np.asarray(sofa.getParam("Data.IR"), dtype=float)
+        except Exception:
+            raise SOFAError("Convention '{}' does not provide 'Data.IR'"
+                            .format(sofa.convention["name"]))
+        if(ir.ndim not in [3, 4]):
+            raise SOFAError("Unsupported shape {} for 'Data.IR'"
+                            .format(ir.shape))
+        if(int(blockSize) <= 0):
+            raise SOFAError("Block size must be a positive integer")
+
+        self.measurement = measurement
+        self.blockSize = int(blockSize)
+        self.samplingRate = float(np.ravel(
+                sofa.getParam("Data.SamplingRate"))[0])
+
+        # Filters are kept as (R, E, N). Conventions without E use E = 1.
+        filters = ir[measurement]
+        if(filters.ndim == 2):
+            filters = filters[:, np.newaxis, :]
+        self.receivers, self.emitters, self.length = filters.shape
+
+        # Default to a single uniformly partitioned stage
+        if(partitions is None):
+            partitions = [(self.blockSize, None)]
+        self.stages = self._createStages(filters, partitions)
+
+        # Output accumulator ring buffer, large enough for the latest stage
+        size = max([s.offset + s.blockSize for s in self.stages])
+        size = int(np.ceil(size / float(self.blockSize))) * self.blockSize
+        self.output = np.zeros((self.receivers, size))
+        self.head = 0
+        self.time = 0
+
+    def _createStages(self, filters, partitions):
+        stages = []
+        offset = 0
+        for i, (size, count) in enumerate(partitions):
+            size = int(size)
+            if(size <= 0 or size % self.blockSize):
+                raise SOFAError(("Partition size {} must be a positive "
+                                 "multiple of the block size ({})"
+                                 ).format(size, self.blockSize))
+            if(i == 0 and size != self.blockSize):
+                raise SOFAError("The first partition size must equal the "
+                                "block size")
+            # Later stages must start late enough to finish in time
+            if(offset < size - self.blockSize):
+                raise SOFAError(("Partition size {} cannot start at sample "
+                                 "{}. Offsets must be at least the "
+                                 "partition size minus the block size."
+                                 ).format(size, offset))
+            if(offset >= self.length):
+                break
+            end = self.length if count is None else\
+                min(offset + size * int(count), self.length)
+            spectra = partitionSpectra(filters[..., offset:end], size)
+            stages.append(SOFAPartitionStage(spectra, size, offset))
+            offset = end
+        if(offset < self.length):
+            raise SOFAError(("Partitions only cover {} of {} samples. Use "
+                             "None as the last partition count to cover the "
+                             "remaining filter length.").format(offset,
+                                                                 self.length))
+        return stages
+
+    @property
+    def latency(self):
+        return self.blockSize
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self.output[:] = 0
+        self.head = 0
+        self.time = 0
+
+    def process(self, block):
+        block = np.asarray(block, dtype=float)
+        if(block.ndim == 1):
+            block = np.broadcast_to(block, (self.emitters, block.size))
+        if(block.shape != (self.emitters, self.blockSize)):
+            raise SOFAError(("Input block must have shape ({},) or ({}, {}). "
+                             "You supplied: {}"
+                             ).format(self.blockSize, self.emitters,
+                                      self.blockSize, block.shape))
+        size = self.output.shape[-1]
+        for stage in self.stages:
+            if(stage.push(block)):
+                # Stage output starts at its offset, relative to this block
+                start = self.head + stage.offset - stage.blockSize +\
+                    self.blockSize
+                index = (start + np.arange(stage.blockSize)) % size
+                self.output[:, index] += stage.compute()
+
+        # Emit current block and clear its slot in the ring buffer
+        index = self.head + np.arange(self.blockSize)
+        result = self.output[:, index].copy()
+        self.output[:, index] = 0
+        self.head = (self.head + self.blockSize) % size
+        self.time += self.blockSize
+        return result
+
+    def processSignal(self, signal):
+        signal = np.asarray(signal, dtype=float)
+        # Pad to whole blocks, including the filter tail
+        total = signal.shape[-1] + self.length - 1
+        blocks = int(np.ceil(total / float(self.blockSize)))
+        padded = np.zeros(signal.shape[:-1] + (blocks * self.blockSize,))
+        padded[..., :signal.shape[-1]] = signal
+
+        self.reset()
+        result = np.concatenate([self.process(padded[..., i * self.blockSize:
+                                                     (i + 1) * self.blockSize])
+                                 for i in range(blocks)], axis=-1)
+        return result[:, :total]
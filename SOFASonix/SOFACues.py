@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFACues.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFADSP import broadcastDelay, onsets
+from .SOFAProcessing import getImpulseResponses
+from .SOFASonixError import SOFAError
+
+# Octave band centre frequencies used for band-wise ILDs
+OCTAVE_BANDS = [125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+
+class SOFACues(object):
+    # Cached cues are dropped when any of these fields change
+    FIELDS = ["Data.IR", "Data.SamplingRate", "Data.Delay"]
+
+    def __init__(self, sofa, threshold=-20.0):
+        ir = getImpulseResponses(sofa)
+        if(ir.ndim < 3 or ir.shape[1] < 2):
+            raise SOFAError("Binaural cues require at least two receivers")
+        self.sofa = sofa
+        self.threshold = float(threshold)
+        self.samplingRate = float(np.ravel(
+                sofa.getParam("Data.SamplingRate"))[0])
+
+    def _cached(self, key, compute):
+        return self.sofa.cached("cues", key, SOFACues.FIELDS, compute)
+
+    def onsets(self):
+        # Onsets in samples, including Data.Delay - (M, R[, E])
+        def compute():
+            ir = self.sofa.getParam("Data.IR")
+            return onsets(ir, self.threshold) + broadcastDelay(
+                    self.sofa.getParam("Data.Delay"), ir.shape[:-1])
+        return self._cached(("onsets", self.threshold), compute)
+
+    def energy(self, decibels=False):
+        def compute():
+            energy = np.sum(self.sofa.getParam("Data.IR") ** 2, axis=-1)
+            return 10 * np.log10(np.maximum(energy, 1e-300)) if decibels\
+                else energy
+        return self._cached(("energy", bool(decibels)), compute)
+
+    def itd(self, method="xcorr", cutoff=3000.0, maxLag=0.001):
+        # Interaural time difference (left - right) in seconds - (M[, E])
+        if(method == "threshold"):
+            def compute():
+                onset = self.onsets()
+                return (onset[:, 0] - onset[:, 1]) / self.samplingRate
+        elif(method == "xcorr"):
+            def compute():
+                return self._crossCorrelation(cutoff, maxLag)
+        else:
+            raise SOFAError("ITD method must be either 'xcorr' or "
+                            "'threshold'")
+        return self._cached(("itd", method, cutoff, maxLag), compute)
+
+    def _crossCorrelation(self, cutoff, maxLag):
+        length = self.sofa.getParam("Data.IR").shape[-1]
+        nfft = 2 * length
+        spectra = self.sofa.spectrum(nfft)
+        frequencies = np.fft.rfftfreq(nfft, 1.0 / self.samplingRate)
+
+        # Low-passed cross-correlation of both ears for all measurements
+        cross = spectra[:, 0] * np.conj(spectra[:, 1])
+        if(cutoff):
+            cross = cross * (frequencies <= cutoff)
+        correlation = np.fft.irfft(cross, nfft, axis=-1)
+
+        # Search lags within +/- maxLag, negative lags wrap around
+        limit = max(min(int(np.ceil(maxLag * self.samplingRate)),
+                        length - 1), 1)
+        lags = np.arange(-limit, limit + 1)
+        window = correlation[..., lags % nfft]
+        peak = np.argmax(window, axis=-1)
+
+        # Parabolic interpolation around the peak
+        inner = np.clip(peak, 1, lags.size - 2)
+        left, centre, right = [np.take_along_axis(
+                window, (inner + i)[..., np.newaxis], axis=-1)[..., 0]
+                for i in [-1, 0, 1]]
+        curvature = left - 2 * centre + right
+        offset = np.where((peak == inner) & (curvature < 0),
+                          0.5 * (left - right) /
+                          np.where(curvature < 0, curvature, -1), 0)
+
+        # Add differences of stored delays
+        delay = broadcastDelay(self.sofa.getParam("Data.Delay"),
+                               spectra.shape[:-1])
+        return (lags[peak] + offset + delay[:, 0] - delay[:, 1]) /\
+            self.samplingRate
+
+    def ild(self, bands=None, fraction=1.0):
+        # Band-wise interaural level differences in dB - (M[, E], B)
+        bands = np.asarray(OCTAVE_BANDS if bands is None else bands,
+                           dtype=float)
+
+        def compute():
+            nfft = self.sofa.getParam("Data.IR").shape[-1]
+            power = self.sofa.spectrum(nfft, magnitude=True) ** 2
+            frequencies = np.fft.rfftfreq(nfft, 1.0 / self.samplingRate)
+
+            # Band energies from cumulative sums over bins
+            edges = 2 ** (0.5 / fraction)
+            lower = np.searchsorted(frequencies, bands / edges)
+            upper = np.searchsorted(frequencies, bands * edges)
+            total = np.concatenate([np.zeros(power.shape[:-1] + (1,)),
+                                    np.cumsum(power, axis=-1)], axis=-1)
+            energy = np.maximum(total[..., upper] - total[..., lower],
+                                1e-300)
+            return 10 * np.log10(energy[:, 0] / energy[:, 1])
+        return self._cached(("ild", tuple(bands), fraction), compute)
+
+    def broadbandILD(self):
+        energy = np.maximum(self.energy(), 1e-300)
+        return 10 * np.log10(energy[:, 0] / energy[:, 1])
+
+    def export(self, prefix="Cues", method="xcorr", bands=None):
+        # Store cues as extra variables, written by SOFASonix.export
+        ir = self.sofa.getParam("Data.IR")
+        measured = "M" + ("E" if ir.ndim == 4 else "")
+        received = "MR" + ("E" if ir.ndim == 4 else "")
+        variables = [("ITD", self.itd(method), measured, "second"),
+                     ("ILD", self.broadbandILD(), measured, "decibel"),
+                     ("Onset", self.onsets(), received, "samples"),
+                     ("Energy", self.energy(), received, "")]
+        bands = OCTAVE_BANDS if bands is None else bands
+        for band, values in zip(bands, np.moveaxis(self.ild(bands), -1, 0)):
+            variables.append(("ILD.{:g}Hz".format(band), values, measured,
+                              "decibel"))
+
+        for name, values, dims, units in variables:
+            key = "{}.{}".format(prefix, name)
+            self.sofa.setParam(key, np.array(values), force=True)
+            self.sofa.getParam(key, True).dimensions = [dims]
+            if(units):
+                self.sofa.setParam("{}:Units".format(key), units, force=True)
+        return self.sofa
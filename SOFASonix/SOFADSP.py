@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFADSP.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from fractions import Fraction
+from .SOFASonixError import SOFAError
+
+
+def chunks(size, chunk=None):
+    chunk = size if not chunk else max(int(chunk), 1)
+    for start in range(0, size, chunk):
+        yield slice(start, min(start + chunk, size))
+
+
+def broadcastDelay(delay, shape):
+    # Expand Data.Delay (I.../M...) to the leading shape of Data.IR
+    delay = np.asarray(delay, dtype=float)
+    return np.broadcast_to(delay, shape)
+
+
+def minimumPhaseSpectrum(magnitude, nfft):
+    # Minimum-phase spectrum for a magnitude on the rfft grid of nfft
+    magnitude = np.abs(np.asarray(magnitude))
+    floor = np.maximum(magnitude.max(axis=-1, keepdims=True) * 1e-10,
+                       np.finfo(float).tiny)
+    cepstrum = np.fft.irfft(np.log(np.maximum(magnitude, floor)), nfft,
+                            axis=-1)
+
+    # Fold the anti-causal part of the real cepstrum onto the causal part
+    fold = np.zeros(nfft)
+    fold[0] = 1
+    fold[1:(nfft + 1) // 2] = 2
+    if(nfft % 2 == 0):
+        fold[nfft // 2] = 1
+    return np.exp(np.fft.rfft(cepstrum * fold, axis=-1))
+
+
+def minimumPhase(data, length=None, nfft=None):
+    data = np.asarray(data, dtype=float)
+    length = data.shape[-1] if length is None else int(length)
+    # Zero-pad generously to limit cepstral aliasing
+    if(nfft is None):
+        nfft = 8 * 2 ** int(np.ceil(np.log2(max(data.shape[-1], length))))
+    spectrum = minimumPhaseSpectrum(np.fft.rfft(data, nfft, axis=-1), nfft)
+    return np.fft.irfft(spectrum, nfft, axis=-1)[..., :length]
+
+
+def smoothSpectrum(magnitude, fraction=3.0):
+    # Fractional-octave smoothing of magnitudes on a linear bin grid
+    power = np.asarray(magnitude, dtype=float) ** 2
+    if(not fraction):
+        return np.sqrt(power)
+    bins = np.arange(power.shape[-1])
+    width = 2 ** (0.5 / fraction)
+    lower = np.clip(np.floor(bins / width), 0, bins.size - 1).astype(int)
+    upper = np.clip(np.ceil(bins * width), 0, bins.size - 1).astype(int)
+    upper = np.maximum(upper, lower)
+
+    # Mean power in each window from cumulative sums
+    total = np.concatenate([np.zeros(power.shape[:-1] + (1,)),
+                            np.cumsum(power, axis=-1)], axis=-1)
+    return np.sqrt((total[..., upper + 1] - total[..., lower]) /
+                   (upper - lower + 1))
+
+
+def onsets(data, threshold=-20.0):
+    # First crossing of a level relative to each row's peak (fractional)
+    envelope = np.abs(np.asarray(data, dtype=float))
+    level = envelope.max(axis=-1, keepdims=True) * 10 ** (threshold / 20.0)
+    index = np.argmax(envelope >= level, axis=-1)
+
+    current = np.take_along_axis(envelope, index[..., np.newaxis],
+                                 axis=-1)[..., 0]
+    previous = np.take_along_axis(envelope, np.maximum(index - 1, 0)
+                                  [..., np.newaxis], axis=-1)[..., 0]
+    rise = current - previous
+    fraction = np.where(rise > 0, (current - level[..., 0]) /
+                        np.where(rise > 0, rise, 1), 0)
+    return np.where(index > 0, index - fraction, 0).astype(float)
+
+
+def decayLength(data, threshold=-60.0):
+    # Samples until the backward-integrated energy decays below threshold
+    power = np.asarray(data, dtype=float) ** 2
+    remaining = np.cumsum(power[..., ::-1], axis=-1)[..., ::-1]
+    total = np.maximum(remaining[..., :1], np.finfo(float).tiny)
+    below = remaining / total <= 10 ** (threshold / 10.0)
+    return np.where(np.any(below, axis=-1), np.argmax(below, axis=-1),
+                    power.shape[-1])
+
+
+def fadeWindow(length, fade):
+    # Flat window with a half-Hann fade-out over the last samples
+    window = np.ones(int(length))
+    fade = int(min(max(fade, 0), length))
+    if(fade):
+        window[length - fade:] = 0.5 + 0.5 * np.cos(
+                np.pi * (np.arange(fade) + 1) / (fade + 1))
+    return window
+
+
+def sosSections(sos):
+    # Split (..., 6Q) second-order section data into (..., Q, 6)
+    sos = np.asarray(sos, dtype=float)
+    if(sos.shape[-1] % 6):
+        raise SOFAError(("Second-order section data must contain multiples "
+                         "of 6 coefficients. You supplied: {}"
+                         ).format(sos.shape[-1]))
+    sections = sos.reshape(sos.shape[:-1] + (sos.shape[-1] // 6, 6))
+    if(np.any(sections[..., 3] == 0)):
+        raise SOFAError("Second-order sections require a0 != 0")
+    # Normalize coefficients by a0
+    return sections / sections[..., 3:4]
+
+
+def sosLength(sos, threshold=1e-6, maximum=16384):
+    # Estimate where the slowest decaying pole falls below threshold
+    sections = sosSections(sos)
+    a1, a2 = sections[..., 4], sections[..., 5]
+    root = np.sqrt(a1.astype(complex) ** 2 - 4 * a2)
+    radius = np.max(np.maximum(np.abs((-a1 + root) / 2),
+                               np.abs((-a1 - root) / 2)))
+    if(radius >= 1):
+        raise SOFAError("Second-order sections are not stable")
+    if(radius == 0):
+        return sections.shape[-2] * 2 + 1
+    return int(min(np.ceil(np.log(threshold) / np.log(radius)), maximum))
+
+
+def sosImpulseResponse(sos, length):
+    sections = sosSections(sos)
+    length = int(length)
+    # Impulses for every cascade - (..., L)
+    signal = np.zeros(sections.shape[:-2] + (length,))
+    signal[..., 0] = 1.0
+
+    # Direct form II transposed, vectorized over all cascades
+    for q in range(sections.shape[-2]):
+        b0, b1, b2, _, a1, a2 = [sections[..., q, i] for i in range(6)]
+        state1 = np.zeros(sections.shape[:-2])
+        state2 = np.zeros(sections.shape[:-2])
+        for n in range(length):
+            x = signal[..., n]
+            y = b0 * x + state1
+            state1 = b1 * x - a1 * y + state2
+            state2 = b2 * x - a2 * y
+            signal[..., n] = y
+    return signal
+
+
+def sosFrequencyResponse(sos, frequencies, samplingRate):
+    sections = sosSections(sos)[..., np.newaxis]
+    # z^-1 on the requested grid - (F,)
+    z = np.exp(-2j * np.pi * np.asarray(frequencies, dtype=float) /
+               float(samplingRate))
+    numerator = sections[..., 0, :] + z * (sections[..., 1, :] +
+                                           z * sections[..., 2, :])
+    denominator = sections[..., 3, :] + z * (sections[..., 4, :] +
+                                             z * sections[..., 5, :])
+    return np.prod(numerator / denominator, axis=-2)
+
+
+def rateRatio(source, target, limit=10000):
+    ratio = Fraction(float(target)).limit_denominator(limit) /\
+        Fraction(float(source)).limit_denominator(limit)
+    return ratio.numerator, ratio.denominator
+
+
+def polyphaseFilter(up, down, zeroCrossings=10, beta=5.0):
+    # Kaiser windowed sinc lowpass at the lower of both Nyquist rates
+    rate = max(up, down)
+    half = zeroCrossings * rate
+    n = np.arange(2 * half + 1) - half
+    taps = np.sinc(n / float(rate)) * np.kaiser(2 * half + 1, beta)
+    return taps * (up / taps.sum()), half
+
+
+def resamplePolyphase(data, up, down, zeroCrossings=10, beta=5.0):
+    data = np.asarray(data, dtype=float)
+    length = data.shape[-1]
+    taps, half = polyphaseFilter(up, down, zeroCrossings, beta)
+
+    # Output k reads the upsampled signal at k * down, compensating delay
+    outputs = int(np.ceil(length * up / float(down)))
+    position = np.arange(outputs) * down + half
+    phase = position % up
+    base = position // up
+
+    # Taps of each output's phase - (K, J)
+    count = int(np.ceil(taps.size / float(up)))
+    padded = np.zeros(count * up + up)
+    padded[:taps.size] = taps
+    weights = padded[phase[:, np.newaxis] + np.arange(count) * up]
+
+    # Zero-pad input so that every tap reads a valid sample
+    extended = np.zeros(data.shape[:-1] + (length + 2 * count + 1,))
+    extended[..., count:count + length] = data
+    index = base + count
+
+    # Multiply-add one tap at a time over all rows
+    result = np.zeros(data.shape[:-1] + (outputs,))
+    for j in range(count):
+        result += extended[..., index - j] * weights[:, j]
+    return result
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFADiff.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import hashlib
+import numpy as np
+from .SOFAHash import CHUNK_BYTES, SOFAArraySource
+
+
+def _dimensions(source, key):
+    try:
+        return tuple(source.dimensions(key))
+    except ValueError:
+        # Unshaped defaults (e.g. a bare 3-vector) match no dimension set,
+        # such variables are compared by shape only
+        return ()
+
+
+def _compareVariable(a, b, key, rtol, atol, chunkBytes):
+    shape, string = a.variables[key]
+    result = {"status": "equal", "maxDifference": 0.0}
+    rows = len(shape) and _dimensions(a, key)[:1] == ("M",) and\
+        shape[0] == a.measurements
+    changed = []
+
+    # Walk both arrays in step, one chunk of each in memory at a time
+    for (part, left), (_, right) in zip(a.chunks(key, chunkBytes),
+                                        b.chunks(key, chunkBytes)):
+        if(hashlib.sha1(left.tobytes()).digest() ==
+           hashlib.sha1(right.tobytes()).digest()):
+            continue
+        if(string):
+            mismatch = left != right
+        else:
+            difference = np.abs(left - right)
+            result["maxDifference"] = max(result["maxDifference"],
+                                          float(np.nanmax(difference)))
+            mismatch = ~np.isclose(left, right, rtol, atol, equal_nan=True)
+        if(not np.any(mismatch)):
+            continue
+        result["status"] = "changed"
+        if(rows):
+            flags = mismatch.reshape(mismatch.shape[0], -1).any(axis=-1)
+            changed.extend((np.flatnonzero(flags) + part.start).tolist())
+
+    if(rows):
+        result["measurements"] = changed
+    if(result["status"] == "equal" and result["maxDifference"] > 0):
+        result["status"] = "within tolerance"
+    return result
+
+
+def diff(a, b, rtol=0.0, atol=0.0, ignore=("GLOBAL:DateModified",),
+         chunkBytes=CHUNK_BYTES):
+    # Accepts SOFASonix objects or file paths
+    ignore = set(ignore or [])
+    with SOFAArraySource(a) as left, SOFAArraySource(b) as right:
+        report = {"attributes": {"added": {}, "removed": {}, "changed": {}},
+                  "dimensions": {}, "variables": {}, "measurements": []}
+
+        attributes = report["attributes"]
+        for key in sorted(set(left.attributes) | set(right.attributes)):
+            if(key in ignore):
+                continue
+            if(key not in right.attributes):
+                attributes["removed"][key] = left.attributes[key]
+            elif(key not in left.attributes):
+                attributes["added"][key] = right.attributes[key]
+            elif(left.attributes[key] != right.attributes[key]):
+                attributes["changed"][key] = [left.attributes[key],
+                                              right.attributes[key]]
+
+        dimensions = {}
+        for source, side in [(left, 0), (right, 1)]:
+            for key, (shape, _) in source.variables.items():
+                for name, size in zip(_dimensions(source, key), shape):
+                    dimensions.setdefault(name, [None, None])[side] = size
+        report["dimensions"] = {k: v for k, v in sorted(dimensions.items())
+                                if v[0] != v[1]}
+
+        measurements = set()
+        for key in sorted(set(left.variables) | set(right.variables)):
+            if(key in ignore):
+                continue
+            if(key not in right.variables):
+                report["variables"][key] = {"status": "removed"}
+            elif(key not in left.variables):
+                report["variables"][key] = {"status": "added"}
+            elif(left.variables[key] != right.variables[key]):
+                report["variables"][key] = {
+                        "status": "shape",
+                        "shapes": [list(left.variables[key][0]),
+                                   list(right.variables[key][0])]}
+            else:
+                result = _compareVariable(left, right, key, rtol, atol,
+                                          chunkBytes)
+                if(result["status"] != "equal"):
+                    report["variables"][key] = result
+                    measurements.update(result.get("measurements", []))
+
+        report["measurements"] = sorted(measurements)
+        report["identical"] = not (any(attributes.values()) or
+                                   report["dimensions"] or
+                                   any(v["status"] != "within tolerance"
+                                       for v in report["variables"].values()))
+        return report
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFADirectivity.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from collections import OrderedDict
+from .SOFASpatial import (SOFASpatialIndex, getDirections, normalize,
+                          sphericalToCartesian, interpolationWeights)
+from .SOFASonixError import SOFAError, SOFAFieldError
+
+
+class SOFADirectivity(object):
+    def __init__(self, sofa, grid="receiver", neighbours=3, power=1.0,
+                 cacheSize=64):
+        if(grid not in ["receiver", "source"]):
+            raise SOFAError("Grid must either be 'receiver' or 'source'")
+        try:
+            data = np.asarray(sofa.getParam("Data.Real"), dtype=float) +\
+                1j * np.asarray(sofa.getParam("Data.Imag"), dtype=float)
+            frequencies = np.asarray(sofa.getParam("N"), dtype=float)
+        except SOFAFieldError:
+            raise SOFAError("Convention '{}' does not provide transfer "
+                            "functions".format(sofa.convention["name"]))
+
+        # Per-emitter frequencies must agree (NE)
+        if(frequencies.ndim > 1):
+            if(not np.allclose(frequencies, frequencies[:, :1])):
+                raise SOFAError("Emitters with different frequency grids "
+                                "are not supported")
+            frequencies = frequencies[:, 0]
+        self.frequencies = frequencies.ravel()
+        if(np.any(np.diff(self.frequencies) <= 0)):
+            raise SOFAError("Frequencies must be strictly increasing")
+
+        # Measured directions along the first axis - (D, ..., N)
+        if(grid == "receiver"):
+            directions = self._receiverDirections(sofa)
+            data = np.moveaxis(data, 1, 0)
+        else:
+            directions = getDirections(sofa)
+        self.directions = directions
+        self.data = data
+        self.shape = data.shape[1:-1]
+        self.index = SOFASpatialIndex(directions)
+        self.neighbours = max(int(neighbours), 1)
+        self.power = power
+
+        # Neighbour weights and frequency tables of recent queries
+        self.cacheSize = max(int(cacheSize), 1)
+        self.weightCache = OrderedDict()
+        self.tableCache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _receiverDirections(self, sofa):
+        positions = np.asarray(sofa.getParam("ReceiverPosition"),
+                               dtype=float)
+        if(positions.ndim == 3):
+            positions = positions[:, :, 0]
+        try:
+            coordinates = sofa.getParam("ReceiverPosition:Type").lower()
+        except Exception:
+            coordinates = "cartesian"
+        if(coordinates == "spherical"):
+            positions = sphericalToCartesian(positions)
+        return normalize(positions)
+
+    def _cached(self, cache, key, compute):
+        if(key in cache):
+            self.hits += 1
+            value = cache.pop(key)
+        else:
+            self.misses += 1
+            value = compute()
+            if(len(cache) >= self.cacheSize):
+                cache.popitem(last=False)
+        cache[key] = value
+        return value
+
+    def weights(self, directions, cartesian=True):
+        directions = np.ascontiguousarray(directions, dtype=float)
+
+        def compute():
+            points = directions if cartesian else\
+                sphericalToCartesian(directions)
+            distances, indices = self.index.query(points, self.neighbours)
+            return indices, interpolationWeights(distances, self.power)
+        return self._cached(self.weightCache,
+                            (directions.shape, cartesian,
+                             directions.tobytes()), compute)
+
+    def table(self, frequencies, magnitude=False):
+        frequencies = np.ascontiguousarray(frequencies, dtype=float).ravel()
+
+        def compute():
+            # Linear interpolation between bins, clamped at the edges
+            data = np.abs(self.data) if magnitude else self.data
+            if(self.frequencies.size == 1):
+                return np.repeat(data, frequencies.size, axis=-1)
+            position = np.interp(frequencies, self.frequencies,
+                                 np.arange(self.frequencies.size))
+            lower = np.minimum(np.floor(position).astype(int),
+                               self.frequencies.size - 2)
+            fraction = position - lower
+            return data[..., lower] * (1 - fraction) +\
+                data[..., lower + 1] * fraction
+        return self._cached(self.tableCache,
+                            (magnitude, frequencies.tobytes()), compute)
+
+    def evaluate(self, directions, frequencies, magnitude=False,
+                 cartesian=True):
+        # Directivity for every direction and frequency - (Q, ..., F)
+        indices, weights = self.weights(directions, cartesian)
+        table = self.table(frequencies, magnitude)
+        shape = indices.shape[:-1]
+        indices = indices.reshape(-1, indices.shape[-1])
+        weights = weights.reshape(indices.shape)
+        result = np.einsum("qk,qk...->q...", weights, table[indices])
+        return result.reshape(shape + result.shape[1:])
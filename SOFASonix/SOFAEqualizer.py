@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAEqualizer.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFASonix import SOFASonix
+from .SOFADSP import chunks, minimumPhaseSpectrum, smoothSpectrum
+from .SOFAProcessing import getImpulseResponses
+from .SOFASpatial import getDirections, solidAngleWeights
+from .SOFASonixError import SOFAError
+
+
+class SOFAEqualizer(object):
+    def __init__(self, sofa, weights="neighbours", smoothing=3.0,
+                 maxBoost=20.0, normalize=1000.0, common=False, nfft=None):
+        ir = getImpulseResponses(sofa)
+        self.sofa = sofa
+        self.samplingRate = float(np.ravel(
+                sofa.getParam("Data.SamplingRate"))[0])
+        self.nfft = 2 * 2 ** int(np.ceil(np.log2(ir.shape[-1]))) if\
+            nfft is None else int(nfft)
+        self.frequencies = np.fft.rfftfreq(self.nfft, 1.0 / self.samplingRate)
+
+        # Diffuse-field power average over SourcePosition - (R[, E], K)
+        self.weights = self._weights(weights, ir.shape[0])
+        power = sofa.spectrum(self.nfft, magnitude=True) ** 2
+        average = np.sqrt(np.tensordot(self.weights, power, axes=(0, 0)))
+        if(common):
+            average = np.sqrt(np.mean(average ** 2, axis=0, keepdims=True))
+        self.average = smoothSpectrum(average, smoothing)
+
+        # Regularized inverse, limited to maxBoost relative to the peak
+        floor = self.average.max(axis=-1, keepdims=True) *\
+            10 ** (-float(maxBoost) / 20.0)
+        inverse = 1.0 / np.maximum(self.average, floor)
+        if(normalize):
+            reference = np.argmin(np.abs(self.frequencies - normalize))
+            inverse = inverse / inverse[..., reference:reference + 1]
+        self.inverse = minimumPhaseSpectrum(inverse, self.nfft)
+
+    def _weights(self, weights, count):
+        if(isinstance(weights, str)):
+            if(weights == "uniform"):
+                return np.full(count, 1.0 / count)
+            elif(weights == "neighbours"):
+                return solidAngleWeights(getDirections(self.sofa))
+            raise SOFAError("Weights must be 'uniform', 'neighbours' or an "
+                            "array of M values")
+        weights = np.ravel(np.asarray(weights, dtype=float))
+        if(weights.size != count or np.any(weights < 0) or
+           weights.sum() <= 0):
+            raise SOFAError("Weights must contain {} non-negative values"
+                            .format(count))
+        return weights / weights.sum()
+
+    def apply(self, sofa=None, chunk=None):
+        sofa = self.sofa if sofa is None else sofa
+        ir = getImpulseResponses(sofa)
+        if(ir.shape[-1] > self.nfft):
+            raise SOFAError("Data.IR is longer than the equalizer transform")
+
+        # Filter every row in one frequency-domain pass per chunk
+        result = np.empty(ir.shape)
+        for part in chunks(ir.shape[0], chunk):
+            spectra = np.fft.rfft(ir[part], self.nfft, axis=-1) *\
+                self.inverse
+            result[part] = np.fft.irfft(spectra, self.nfft,
+                                        axis=-1)[..., :ir.shape[-1]]
+        return sofa.copy({"Data.IR": result})
+
+    def export(self, inverse=False, length=None):
+        # Common transfer function (or its inverse) as a GeneralFIR object
+        spectrum = self.inverse if inverse else\
+            minimumPhaseSpectrum(self.average, self.nfft)
+        length = self.nfft if length is None else int(length)
+        ir = np.fft.irfft(spectrum, self.nfft, axis=-1)[..., :length]
+        ir = ir.reshape((1, -1, length))
+        receivers = ir.shape[1]
+
+        ctf = SOFASonix("GeneralFIR", verbose=self.sofa.verbose)
+        for key, field in self.sofa.params.get("global", {}).items():
+            if(field.isType("attribute") and not field.isReadOnly() and
+               key in ctf.params["global"] and not field.isEmpty()):
+                ctf.setParam(key, field.value)
+        ctf.setParam("GLOBAL:Comment", "{} of '{}'".format(
+                "Inverse common transfer function" if inverse else
+                "Common transfer function",
+                self.sofa.getParam("GLOBAL:Title")))
+
+        receiverPosition = np.asarray(self.sofa.getParam("ReceiverPosition"))
+        if(receiverPosition.ndim != 3 or receiverPosition.shape[0] !=
+           receivers or receiverPosition.shape[-1] != 1):
+            receiverPosition = np.zeros((receivers, 3, 1))
+        else:
+            for attr in ["Type", "Units"]:
+                ctf.setParam("ReceiverPosition:{}".format(attr),
+                             self.sofa.getParam("ReceiverPosition:{}"
+                                                .format(attr)))
+        ctf.setParam("ListenerPosition", np.zeros((1, 3)))
+        ctf.setParam("SourcePosition", np.array([[0, 0, 1.0]]))
+        ctf.setParam("EmitterPosition", np.zeros((1, 3, 1)))
+        ctf.setParam("ReceiverPosition", receiverPosition)
+        ctf.setParam("Data.IR", ir)
+        ctf.setParam("Data.SamplingRate", np.array([self.samplingRate]))
+        ctf.setParam("Data.Delay", np.zeros((1, receivers)))
+        return ctf
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAHash.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import hashlib
+import numpy as np
+import netCDF4
+from .SOFASonix import SOFASonix, IO_LOCK
+from .SOFASonixError import SOFAError
+
+# Bytes read per chunk when walking a variable
+CHUNK_BYTES = 1 << 24
+
+
+def _canonical(values, string):
+    # Byte layout that is identical for files and loaded objects
+    values = np.ma.getdata(values)
+    if(string):
+        return np.ascontiguousarray(values, dtype="S1")
+    return np.ascontiguousarray(values, dtype="<f8")
+
+
+class SOFAArraySource(object):
+    # Chunked read access to the variables of a file or a loaded object
+    def __init__(self, source):
+        self.path = None
+        self.sofa = None
+        if(isinstance(source, SOFASonix)):
+            self.sofa = source
+            params = source.flatten()
+            self.variables = {k: (np.shape(v.value), v.isType("string"))
+                              for k, v in params.items()
+                              if (v.isType("double") or v.isType("string"))
+                              and not v.isEmpty()}
+            self.attributes = {k: str(v.value) for k, v in params.items()
+                               if v.isType("attribute")}
+            self.measurements = source.getDim("M")
+        else:
+            self.path = source
+            with IO_LOCK:
+                self.raw = netCDF4.Dataset(source, "r", "NETCDF4")
+                self.raw.set_auto_mask(False)
+                self.variables = {k: (v.shape, v.dtype.kind == "S")
+                                  for k, v in self.raw.variables.items()}
+                self.attributes = {}
+                for key, variable in self.raw.variables.items():
+                    for name in variable.ncattrs():
+                        self.attributes["{}:{}".format(key, name)] = str(
+                                getattr(variable, name))
+                for name in self.raw.ncattrs():
+                    self.attributes["GLOBAL:{}".format(name)] = str(
+                            getattr(self.raw, name))
+                self.measurements = len(self.raw.dimensions["M"])\
+                    if "M" in self.raw.dimensions else None
+
+    def dimensions(self, key):
+        if(self.sofa is not None):
+            return self.sofa.getParam(key, True).getDimensions()
+        return self.raw[key].dimensions
+
+    def read(self, key, index=slice(None)):
+        string = self.variables[key][1]
+        if(self.sofa is not None):
+            param = self.sofa.getParam(key, True)
+            value = param.paddedValue if string else param.value
+            return _canonical(np.asarray(value)[index], string)
+        with IO_LOCK:
+            return _canonical(self.raw[key][index], string)
+
+    def chunks(self, key, chunkBytes=CHUNK_BYTES):
+        # (slice, array) pairs along the first axis
+        shape = self.variables[key][0]
+        if(len(shape) == 0):
+            yield slice(None), self.read(key, Ellipsis)
+            return
+        row = max(int(np.prod(shape[1:])) * 8, 1)
+        rows = max(int(chunkBytes) // row, 1)
+        for start in range(0, shape[0], rows):
+            part = slice(start, min(start + rows, shape[0]))
+            yield part, self.read(key, part)
+
+    def close(self):
+        if(self.path is not None):
+            with IO_LOCK:
+                self.raw.close()
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def variableHash(source, key, chunkBytes=CHUNK_BYTES):
+    shape, string = source.variables[key]
+    digest = hashlib.sha256("{}{}".format(shape, string).encode("utf-8"))
+    for _, values in source.chunks(key, chunkBytes):
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def variableHashes(source, chunkBytes=CHUNK_BYTES):
+    with SOFAArraySource(source) as arrays:
+        return {key: variableHash(arrays, key, chunkBytes)
+                for key in sorted(arrays.variables)}
+
+
+def fingerprint(source, chunkBytes=CHUNK_BYTES):
+    # Content only, attributes such as dates or titles are ignored
+    digest = hashlib.sha256()
+    for key, value in sorted(variableHashes(source, chunkBytes).items()):
+        digest.update("{}={};".format(key, value).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _measurementAxis(arrays, key):
+    # Position of M within a variable, None if it does not vary along M
+    shape = arrays.variables[key][0]
+    try:
+        dimensions = list(arrays.dimensions(key))
+    except ValueError:
+        # Unshaped defaults (e.g. a bare 3-vector) match no dimension set
+        return None
+    if("M" in dimensions):
+        axis = dimensions.index("M")
+        if(axis < len(shape) and shape[axis] == arrays.measurements):
+            return axis
+    return None
+
+
+def measurementKeys(arrays, data=True):
+    # Variables that vary along M, only Data variables if data=True
+    return sorted(k for k in arrays.variables
+                  if (k.startswith("Data.") or not data) and
+                  _measurementAxis(arrays, k) is not None)
+
+
+def measurementHashes(source, keys=None, chunkBytes=CHUNK_BYTES):
+    # One digest per measurement over the given M-dimensioned variables
+    with SOFAArraySource(source) as arrays:
+        if(arrays.measurements is None):
+            raise SOFAError("Source has no measurement dimension")
+        keys = measurementKeys(arrays) if keys is None else list(keys)
+        digests = [hashlib.sha256() for _ in range(arrays.measurements)]
+        for key in keys:
+            axis = _measurementAxis(arrays, key)
+            if(axis is None):
+                raise SOFAError("'{}' does not vary along M".format(key))
+            # Variables with M elsewhere (e.g. rCM) are small positions
+            parts = arrays.chunks(key, chunkBytes) if axis == 0 else\
+                [(slice(0, arrays.measurements),
+                  np.ascontiguousarray(np.moveaxis(arrays.read(key),
+                                                   axis, 0)))]
+            for part, values in parts:
+                for offset, row in enumerate(values):
+                    digests[part.start + offset].update(row.tobytes())
+        return np.array([d.hexdigest() for d in digests])
+
+
+def duplicateMeasurements(source, keys=None, chunkBytes=CHUNK_BYTES):
+    # Groups of measurement indices with identical content
+    hashes = measurementHashes(source, keys, chunkBytes)
+    _, inverse, counts = np.unique(hashes, return_inverse=True,
+                                   return_counts=True)
+    groups = [np.flatnonzero(inverse == i) for i in np.flatnonzero(
+              counts > 1)]
+    return sorted(groups, key=lambda group: group[0])
+
+
+def duplicateFiles(paths, workers=None, chunkBytes=CHUNK_BYTES):
+    from .SOFACommand import collect
+    files = [path for path, _ in collect(paths)]
+
+    def compute(path):
+        try:
+            return fingerprint(path, chunkBytes)
+        except Exception:
+            return None
+    if(workers and int(workers) > 1 and len(files) > 1):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=int(workers)) as pool:
+            prints = list(pool.map(compute, files))
+    else:
+        prints = [compute(path) for path in files]
+
+    groups = {}
+    for path, value in zip(files, prints):
+        if(value is not None):
+            groups.setdefault(value, []).append(path)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def compact(sofa, keys=None):
+    # Copy without repeated measurements, first occurrences are kept. By
+    # default rows must also match in every M-dimensioned position, so
+    # identical responses at different directions are not dropped.
+    from .SOFAProcessing import selectMeasurements
+    if(keys is None):
+        with SOFAArraySource(sofa) as arrays:
+            keys = measurementKeys(arrays, data=False)
+    hashes = measurementHashes(sofa, keys)
+    _, first = np.unique(hashes, return_index=True)
+    keep = np.sort(first)
+    removed = np.setdiff1d(np.arange(hashes.size), keep)
+    return selectMeasurements(sofa, keep), removed
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAProcessing.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFADSP import (chunks, broadcastDelay, decayLength, fadeWindow,
+                      minimumPhase as minimumPhaseIR, onsets)
+from .SOFASpatial import (SOFASpatialIndex, cartesianToSpherical,
+                          getDirections, getPositions, interpolationWeights,
+                          normalize, sphericalToCartesian)
+from .SOFASonixError import SOFAError, SOFAFieldError
+
+
+def getImpulseResponses(sofa):
+    try:
+        return sofa.getParam("Data.IR")
+    except SOFAFieldError:
+        raise SOFAError("Convention '{}' does not provide 'Data.IR'"
+                        .format(sofa.convention["name"]))
+
+
+def minimumPhase(sofa, length=None, threshold=-20.0, relative=False,
+                 chunk=None):
+    ir = getImpulseResponses(sofa)
+    length = ir.shape[-1] if length is None else int(length)
+    if(length <= 0 or length > ir.shape[-1]):
+        raise SOFAError("Length must be between 1 and N ({})"
+                        .format(ir.shape[-1]))
+
+    result = np.empty(ir.shape[:-1] + (length,))
+    onset = np.empty(ir.shape[:-1])
+    for part in chunks(ir.shape[0], chunk):
+        result[part] = minimumPhaseIR(ir[part], length)
+        onset[part] = onsets(ir[part], threshold)
+
+    # Onsets (in samples) are added to existing delays
+    delay = broadcastDelay(sofa.getParam("Data.Delay"), onset.shape) + onset
+    if(relative):
+        delay = delay - delay.min()
+    return sofa.copy({"Data.IR": result, "Data.Delay": delay})
+
+
+def truncate(sofa, length=None, threshold=-60.0, fade=0.1, multiple=1,
+             chunk=None):
+    ir = getImpulseResponses(sofa)
+    size = ir.shape[-1]
+    if(length is None):
+        # Longest decay of all measurements keeps every row safe
+        length = 0
+        for part in chunks(ir.shape[0], chunk):
+            length = max(length, int(np.max(decayLength(ir[part],
+                                                        threshold))))
+    length = int(np.ceil(max(int(length), 1) / float(multiple)) * multiple)
+    length = min(length, size)
+
+    # Fade below 1 is a fraction of the new length, otherwise in samples
+    if(fade < 0):
+        raise SOFAError("Fade must not be negative")
+    fade = int(round(fade * length)) if fade < 1 else int(round(fade))
+    window = fadeWindow(length, fade)
+
+    # Fraction of each row's energy removed by truncation and fade
+    result = np.empty(ir.shape[:-1] + (length,))
+    discarded = np.zeros(ir.shape[:-1])
+    for part in chunks(ir.shape[0], chunk):
+        result[part] = ir[part, ..., :length] * window
+        total = np.einsum("...n,...n->...", ir[part], ir[part])
+        kept = np.einsum("...n,...n->...", result[part], result[part])
+        discarded[part] = np.where(total > 0, 1 - kept /
+                                   np.where(total > 0, total, 1), 0)
+    return sofa.copy({"Data.IR": result}), discarded
+
+
+def measurementAxis(field, measurements):
+    # Position of the M dimension within a numeric field, if any
+    value = field.value
+    if(not field.isType("double") or not isinstance(value, np.ndarray)):
+        return None
+    for dims in field.dimensions or []:
+        if(len(dims) == value.ndim and "m" in dims.lower()):
+            axis = dims.lower().index("m")
+            if(value.shape[axis] == measurements):
+                return axis
+    return None
+
+
+def selectMeasurements(sofa, indices):
+    # Copy with the given rows of every M-dimensioned variable
+    indices = np.asarray(indices, dtype=int)
+    measurements = sofa.getDim("M")
+    values = {}
+    for key, field in sofa.flatten().items():
+        axis = measurementAxis(field, measurements)
+        if(axis is not None):
+            values[key] = np.take(np.asarray(field.value, dtype=float),
+                                  indices, axis=axis)
+    return sofa.copy(values)
+
+
+def regrid(sofa, grid, method="nearest", neighbours=3, power=1.0,
+           cartesian=True, unique=False, chunk=None):
+    if(method not in ["nearest", "interpolate"]):
+        raise SOFAError("Method must either be 'nearest' or 'interpolate'")
+    params = sofa.flatten()
+    if(method == "interpolate" and "Data.SOS" in params):
+        raise SOFAError("Second-order sections cannot be interpolated. "
+                        "Please use method='nearest'.")
+
+    grid = np.asarray(grid, dtype=float)
+    grid = grid.reshape(-1, grid.shape[-1])
+    directions = normalize(grid if cartesian else
+                           sphericalToCartesian(grid[:, :2]))
+    k = 1 if method == "nearest" else int(neighbours)
+    index = SOFASpatialIndex(getDirections(sofa))
+    distances, indices = index.query(directions, k)
+
+    if(method == "nearest"):
+        # Drop target directions that resolve to an already picked row
+        if(unique):
+            _, first = np.unique(indices[:, 0], return_index=True)
+            first = np.sort(first)
+            indices, directions = indices[first], directions[first]
+        weights = np.ones(indices.shape)
+    else:
+        weights = interpolationWeights(distances, power)
+
+    measurements = sofa.getDim("M")
+    values = {}
+    for key, field in params.items():
+        axis = measurementAxis(field, measurements)
+        if(axis is None):
+            continue
+        value = np.moveaxis(np.asarray(field.value, dtype=float), axis, 0)
+        # Only data is interpolated, other variables follow the nearest row
+        if(method == "nearest" or not key.startswith("Data.")):
+            result = value[indices[:, 0]]
+        else:
+            result = np.empty((indices.shape[0],) + value.shape[1:])
+            for part in chunks(indices.shape[0], chunk):
+                result[part] = np.einsum("tk,tk...->t...", weights[part],
+                                         value[indices[part]])
+        values[key] = np.moveaxis(result, 0, axis)
+
+    # Interpolated rows sit exactly on the target grid
+    if(method == "interpolate"):
+        radius = np.linalg.norm(getPositions(sofa), axis=-1)[indices]
+        positions = directions * np.einsum("tk,tk->t", weights,
+                                           radius)[:, np.newaxis]
+        if(sofa.getParam("SourcePosition:Type").lower() == "spherical"):
+            positions = cartesianToSpherical(positions)
+        values["SourcePosition"] = positions
+    return sofa.copy(values)
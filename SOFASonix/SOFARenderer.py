@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFARenderer.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from collections import OrderedDict
+from .SOFAConvolver import SOFAPartitionStage, partitionSpectra
+from .SOFASpatial import (SOFASpatialIndex, getDirections,
+                          sphericalToCartesian, interpolationWeights)
+from .SOFASonixError import SOFAError
+
+
+def fadeSpectrum(spectrum):
+    # Multiplying by the raised cosine fade spans three bins of the 2B-point
+    # spectrum, so a crossfade needs only a single inverse transform.
+    lower = np.concatenate([np.conj(spectrum[..., 1:2]),
+                            spectrum[..., :-1]], axis=-1)
+    upper = np.concatenate([spectrum[..., 1:],
+                            np.conj(spectrum[..., -2:-1])], axis=-1)
+    return 0.5 * spectrum + 0.25 * (lower + upper)
+
+
+class SOFAFilterBank(object):
+    def __init__(self, sofa, blockSize=512, cacheSize=1024):
+        try:
+            self.ir = np.asarray(sofa.getParam("Data.IR"), dtype=float)
+        except Exception:
+            raise SOFAError("Convention '{}' does not provide 'Data.IR'"
+                            .format(sofa.convention["name"]))
+        if(self.ir.ndim != 3):
+            raise SOFAError(("Rendering requires 'Data.IR' with dimensions "
+                             "MRN. You supplied: {}").format(self.ir.shape))
+        self.blockSize = int(blockSize)
+        self.measurements, self.receivers, self.length = self.ir.shape
+        self.count = max(int(np.ceil(self.length /
+                                     float(self.blockSize))), 1)
+        self.bins = self.blockSize + 1
+
+        # Spatial lookup of measured directions
+        self.index = SOFASpatialIndex(getDirections(sofa))
+
+        # Partition spectra of visited measurements (least recently used)
+        self.cacheSize = max(int(cacheSize), 1)
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def spectra(self, measurement):
+        measurement = int(measurement)
+        if(measurement in self.cache):
+            self.hits += 1
+            spectra = self.cache.pop(measurement)
+        else:
+            self.misses += 1
+            spectra = partitionSpectra(self.ir[measurement],
+                                       self.blockSize)[:, :, np.newaxis, :]
+            if(len(self.cache) >= self.cacheSize):
+                self.cache.popitem(last=False)
+        self.cache[measurement] = spectra
+        return spectra
+
+    def lookup(self, directions, neighbours=1):
+        # Directions as (azimuth, elevation[, radius]) in degrees
+        distances, indices = self.index.query(
+                sphericalToCartesian(directions), neighbours)
+        return indices, interpolationWeights(distances)
+
+    def combine(self, indices, weights):
+        # Weighted sum of cached partition spectra - (P, R, 1, K)
+        result = None
+        for index, weight in zip(indices, weights):
+            if(weight == 0):
+                continue
+            spectra = self.spectra(index)
+            result = spectra * weight if result is None else\
+                result + spectra * weight
+        return result
+
+    def combineMany(self, indices, weights):
+        # Weighted sums for many sources at once - (P, R, S, K)
+        unique, inverse = np.unique(indices, return_inverse=True)
+        table = np.stack([self.spectra(i)[:, :, 0, :] for i in unique])
+        return np.einsum("sn,snprk->prsk", weights,
+                         table[inverse.reshape(indices.shape)])
+
+
+class SOFADynamicRenderer(object):
+    def __init__(self, sofa, blockSize=512, neighbours=1,
+                 crossfade="frequency", cacheSize=1024):
+        if(crossfade not in ["frequency", "time"]):
+            raise SOFAError("Crossfade must be either 'frequency' or 'time'")
+        self.bank = SOFAFilterBank(sofa, blockSize, cacheSize)
+        self.blockSize = self.bank.blockSize
+        self.neighbours = max(int(neighbours), 1)
+        self.crossfade = crossfade
+
+        # Raised cosine fade-in over one output block
+        self.fade = 0.5 - 0.5 * np.cos(np.pi * np.arange(self.blockSize) /
+                                       self.blockSize)
+
+        placeholder = np.zeros((self.bank.count, self.bank.receivers, 1,
+                                self.bank.bins), dtype=complex)
+        self.stage = SOFAPartitionStage(placeholder, self.blockSize)
+        self.reset()
+
+    def reset(self):
+        self.stage.reset()
+        self.current = None
+        self.currentSpectra = None
+
+    def _target(self, direction):
+        indices, weights = self.bank.lookup(np.asarray(direction)[np.newaxis],
+                                            self.neighbours)
+        key = (tuple(indices[0]), tuple(np.round(weights[0], 6)))
+        if(key == self.current):
+            return key, self.currentSpectra
+        return key, self.bank.combine(indices[0], weights[0])
+
+    def _crossfade(self, old, new):
+        if(self.crossfade == "time"):
+            return self.stage.output(old) * (1 - self.fade) +\
+                self.stage.output(new) * self.fade
+        return self.stage.output(old + fadeSpectrum(new - old))
+
+    def process(self, block, direction):
+        block = np.asarray(block, dtype=float).reshape(1, -1)
+        if(block.shape[-1] != self.blockSize):
+            raise SOFAError("Input block must contain {} samples"
+                            .format(self.blockSize))
+        self.stage.push(block)
+        self.stage.advance()
+
+        key, spectra = self._target(direction)
+        new = self.stage.spectrum(spectra)
+        if(self.current is None or key == self.current):
+            result = self.stage.output(new)
+        else:
+            old = self.stage.spectrum(self.currentSpectra)
+            result = self._crossfade(old, new)
+
+        self.current = key
+        self.currentSpectra = spectra
+        return result
+
+    def render(self, signal, trajectory):
+        signal = np.asarray(signal, dtype=float).ravel()
+        trajectory = np.atleast_2d(np.asarray(trajectory, dtype=float))
+        blocks = int(np.ceil(signal.size / float(self.blockSize)))
+        if(trajectory.shape[0] not in [1, blocks]):
+            raise SOFAError(("Trajectory must contain one direction per "
+                             "block ({}). You supplied: {}"
+                             ).format(blocks, trajectory.shape[0]))
+        trajectory = np.broadcast_to(trajectory, (blocks,) +
+                                     trajectory.shape[1:])
+        padded = np.zeros(blocks * self.blockSize)
+        padded[:signal.size] = signal
+
+        self.reset()
+        return np.concatenate([self.process(padded[i * self.blockSize:
+                                                   (i + 1) * self.blockSize],
+                                            trajectory[i])
+                               for i in range(blocks)], axis=-1)
+
+
+class SOFAMultiSourceRenderer(object):
+    def __init__(self, sofa, sources, blockSize=512, neighbours=1,
+                 cacheSize=1024, workers=None, split="sources"):
+        if(split not in ["sources", "bins"]):
+            raise SOFAError("Split must be either 'sources' or 'bins'")
+        self.bank = SOFAFilterBank(sofa, blockSize, cacheSize)
+        self.blockSize = self.bank.blockSize
+        self.sources = int(sources)
+        self.neighbours = max(int(neighbours), 1)
+        self.split = split
+
+        # Each source occupies one emitter slot of a shared stage - (P,R,S,K)
+        self.spectra = np.zeros((self.bank.count, self.bank.receivers,
+                                 self.sources, self.bank.bins), dtype=complex)
+        self.stage = SOFAPartitionStage(self.spectra, self.blockSize)
+
+        # Optional thread pool, numpy releases the GIL for the heavy lifting
+        self.workers = int(workers) if workers else 1
+        self.pool = None
+        if(self.workers > 1):
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if(self.pool is not None):
+            self.pool.shutdown()
+            self.pool = None
+
+    def reset(self):
+        self.stage.reset()
+        self.indices = np.full((self.sources, self.neighbours), -1,
+                               dtype=np.int64)
+        self.weights = np.zeros((self.sources, self.neighbours))
+        self.active = np.zeros(self.sources, dtype=bool)
+
+    def _accumulate(self, spectra, previous, fdl, sources, changed, bins):
+        # Sum of all sources plus the summed change of switching sources
+        total = np.einsum("prsk,psk->rk", spectra[:, :, sources, bins],
+                          fdl[:, sources, bins])
+        difference = np.einsum("prsk,psk->rk",
+                               spectra[:, :, changed, bins] -
+                               previous[:, :, changed, bins],
+                               fdl[:, changed, bins])
+        return total, difference
+
+    def _tasks(self, sources, changed):
+        bins = slice(None)
+        if(self.pool is None):
+            return [(sources, changed, bins)]
+        if(self.split == "bins"):
+            return [(sources, changed, slice(b[0], b[-1] + 1)) for b in
+                    np.array_split(np.arange(self.bank.bins), self.workers)
+                    if b.size]
+        mask = np.zeros(self.sources, dtype=bool)
+        mask[changed] = True
+        return [(chunk, chunk[mask[chunk]], bins) for chunk in
+                np.array_split(sources, self.workers) if chunk.size]
+
+    def process(self, blocks, directions, active=None):
+        blocks = np.asarray(blocks, dtype=float)
+        if(blocks.shape != (self.sources, self.blockSize)):
+            raise SOFAError(("Input blocks must have shape ({}, {}). You "
+                             "supplied: {}").format(self.sources,
+                                                    self.blockSize,
+                                                    blocks.shape))
+        active = np.ones(self.sources, dtype=bool) if active is None else\
+            np.asarray(active, dtype=bool)
+
+        # Clear history of sources that have been switched off
+        released = self.active & ~active
+        self.stage.window[released] = 0
+        self.stage.fdl[:, released] = 0
+        self.indices[released] = -1
+        self.active = active
+
+        # One stacked transform for all sources
+        self.stage.push(np.where(active[:, np.newaxis], blocks, 0))
+        self.stage.advance()
+
+        sources = np.flatnonzero(active)
+        result = np.zeros((self.bank.receivers, self.blockSize))
+        if(not sources.size):
+            return result
+
+        # Look up filters and rebuild spectra of sources that have moved
+        indices, weights = self.bank.lookup(
+                np.asarray(directions, dtype=float)[sources], self.neighbours)
+        moved = np.any(indices != self.indices[sources], axis=-1) |\
+            np.any(np.abs(weights - self.weights[sources]) > 1e-6, axis=-1)
+        previous = self.spectra.copy() if np.any(moved) else self.spectra
+        if(np.any(moved)):
+            self.spectra[:, :, sources[moved]] = self.bank.combineMany(
+                    indices[moved], weights[moved])
+
+        # Newly activated sources start without a crossfade
+        changed = sources[moved & (self.indices[sources, 0] >= 0)]
+        self.indices[sources] = indices
+        self.weights[sources] = weights
+
+        fdl = self.stage.aligned()
+        tasks = self._tasks(sources, changed)
+        if(self.pool is None):
+            results = [self._accumulate(self.spectra, previous, fdl, *t)
+                       for t in tasks]
+        else:
+            results = list(self.pool.map(
+                    lambda t: self._accumulate(self.spectra, previous,
+                                               fdl, *t), tasks))
+
+        total = np.zeros((self.bank.receivers, self.bank.bins),
+                         dtype=complex)
+        difference = np.zeros_like(total)
+        for task, (partial, change) in zip(tasks, results):
+            total[:, task[2]] += partial
+            difference[:, task[2]] += change
+
+        # Crossfade is linear, so it is applied once to the summed change
+        if(changed.size):
+            total += fadeSpectrum(difference) - difference
+        return self.stage.output(total)
+
+    def render(self, signals, trajectories):
+        signals = np.asarray(signals, dtype=float)
+        trajectories = np.asarray(trajectories, dtype=float)
+        blocks = int(np.ceil(signals.shape[-1] / float(self.blockSize)))
+        if(trajectories.ndim == 2):
+            trajectories = trajectories[:, np.newaxis, :]
+        if(trajectories.shape[1] not in [1, blocks]):
+            raise SOFAError(("Trajectories must contain one direction per "
+                             "block ({}). You supplied: {}"
+                             ).format(blocks, trajectories.shape[1]))
+        trajectories = np.broadcast_to(trajectories, (self.sources, blocks,
+                                                      trajectories.shape[-1]))
+        padded = np.zeros((self.sources, blocks * self.blockSize))
+        padded[:, :signals.shape[-1]] = signals
+
+        self.reset()
+        return np.concatenate([self.process(padded[:, i * self.blockSize:
+                                                   (i + 1) * self.blockSize],
+                                            trajectories[:, i])
+                               for i in range(blocks)], axis=-1)
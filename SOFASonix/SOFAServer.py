@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAServer.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import json
+import os
+import struct
+import threading
+import time
+import numpy as np
+from collections import OrderedDict, deque
+from .SOFASonix import SOFASonix
+from .SOFADSP import broadcastDelay
+from .SOFAProcessing import getImpulseResponses
+from .SOFASpatial import (SOFASpatialIndex, getDirections,
+                          sphericalToCartesian, interpolationWeights)
+from .SOFASonixError import SOFAError
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Response layout: header, float32 IR (Q, R, N), float32 delay (Q, R) in
+# samples, int32 nearest measurement (Q)
+MAGIC = b"SSXR"
+HEADER = struct.Struct("<4sHHIIIf")
+
+
+def encodeResponse(ir, delay, nearest, samplingRate, interpolated):
+    header = HEADER.pack(MAGIC, 1, int(interpolated), ir.shape[0],
+                         ir.shape[1], ir.shape[2], samplingRate)
+    return b"".join([header, ir.astype("<f4").tobytes(),
+                     delay.astype("<f4").tobytes(),
+                     nearest.astype("<i4").tobytes()])
+
+
+def decodeResponse(data):
+    magic, version, flags, q, r, n, rate = HEADER.unpack_from(data)
+    if(magic != MAGIC):
+        raise SOFAError("Invalid response")
+    offset = HEADER.size
+    ir = np.frombuffer(data, "<f4", q * r * n, offset).reshape(q, r, n)
+    offset += ir.nbytes
+    delay = np.frombuffer(data, "<f4", q * r, offset).reshape(q, r)
+    offset += delay.nbytes
+    nearest = np.frombuffer(data, "<i4", q, offset)
+    return {"ir": ir, "delay": delay, "nearest": nearest,
+            "samplingRate": rate, "interpolated": bool(flags & 1)}
+
+
+class SOFAServedSet(object):
+    def __init__(self, sofa):
+        ir = getImpulseResponses(sofa)
+        if(ir.ndim != 3):
+            raise SOFAError(("Serving requires 'Data.IR' with dimensions "
+                             "MRN. You supplied: {}").format(ir.shape))
+        self.ir = np.ascontiguousarray(ir, dtype=np.float32)
+        self.delay = np.ascontiguousarray(broadcastDelay(
+                sofa.getParam("Data.Delay"), ir.shape[:-1]))
+        self.samplingRate = float(np.ravel(
+                sofa.getParam("Data.SamplingRate"))[0])
+        self.index = SOFASpatialIndex(getDirections(sofa))
+        self.info = {"convention": sofa.convention["name"],
+                     "measurements": ir.shape[0], "receivers": ir.shape[1],
+                     "samples": ir.shape[2],
+                     "samplingRate": self.samplingRate}
+
+    def lookup(self, directions, neighbours=1):
+        # Directions as (azimuth, elevation) in degrees - (Q, 2)
+        distances, indices = self.index.query(
+                sphericalToCartesian(directions), neighbours)
+        if(neighbours == 1):
+            index = indices[:, 0]
+            return self.ir[index], self.delay[index], index
+        weights = interpolationWeights(distances).astype(np.float32)
+        ir = np.einsum("qk,qkrn->qrn", weights, self.ir[indices])
+        delay = np.einsum("qk,qkr->qr", weights, self.delay[indices])
+        return ir, delay, indices[:, 0]
+
+
+class SOFAServer(object):
+    def __init__(self, paths, cacheSize=4096, batchWindow=0.002,
+                 maxBatch=65536, maxNeighbours=8, verbose=False):
+        self.sets = OrderedDict()
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            if(name in self.sets):
+                raise SOFAError("Duplicate file name '{}'".format(name))
+            self.sets[name] = SOFAServedSet(SOFASonix.load(path, verbose))
+        self.maxNeighbours = int(maxNeighbours)
+        self.verbose = verbose
+
+        # Encoded responses of recent queries (least recently used)
+        self.cacheSize = int(cacheSize)
+        self.cache = OrderedDict()
+        self.cacheLock = threading.Lock()
+
+        # Concurrent requests are merged into one lookup per set
+        self.batchWindow = float(batchWindow)
+        self.maxBatch = int(maxBatch)
+        self.pending = queue.Queue()
+        self.running = True
+        self.worker = threading.Thread(target=self._batch)
+        self.worker.daemon = True
+        self.worker.start()
+
+        self.started = time.time()
+        self.latencies = deque(maxlen=4096)
+        self.counters = {"requests": 0, "directions": 0, "batches": 0,
+                         "hits": 0, "misses": 0, "errors": 0}
+        self.metricsLock = threading.Lock()
+
+    def _count(self, **values):
+        with self.metricsLock:
+            for key, value in values.items():
+                self.counters[key] += value
+
+    def _batch(self):
+        while(self.running):
+            try:
+                first = self.pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch, total = [first], len(first["directions"])
+            deadline = time.time() + self.batchWindow
+            while(total < self.maxBatch):
+                try:
+                    item = self.pending.get(
+                            timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                batch.append(item)
+                total += len(item["directions"])
+
+            # One lookup per (set, neighbours) group
+            groups = OrderedDict()
+            for item in batch:
+                groups.setdefault((item["name"], item["neighbours"]),
+                                  []).append(item)
+            for (name, neighbours), items in groups.items():
+                try:
+                    served = self.sets[name]
+                    directions = np.concatenate([i["directions"]
+                                                 for i in items])
+                    ir, delay, nearest = served.lookup(directions, neighbours)
+                    start = 0
+                    for item in items:
+                        part = slice(start, start + len(item["directions"]))
+                        item["result"] = encodeResponse(
+                                ir[part], delay[part], nearest[part],
+                                served.samplingRate, neighbours > 1)
+                        start = part.stop
+                except Exception as e:
+                    for item in items:
+                        item["error"] = e
+                for item in items:
+                    item["done"].set()
+            self._count(batches=1)
+
+    def query(self, name, directions, neighbours=1):
+        started = time.time()
+        if(not self.running):
+            raise SOFAError("Server has been closed")
+        if(name not in self.sets):
+            self._count(errors=1)
+            raise SOFAError("Unknown file '{}'".format(name))
+        neighbours = int(neighbours)
+        if(neighbours < 1 or neighbours > self.maxNeighbours):
+            self._count(errors=1)
+            raise SOFAError("Neighbours must be between 1 and {}"
+                            .format(self.maxNeighbours))
+        directions = np.asarray(directions, dtype=float).reshape(-1, 2)
+        if(not np.all(np.isfinite(directions))):
+            self._count(errors=1)
+            raise SOFAError("Directions must be finite")
+
+        key = (name, neighbours, np.round(directions, 6).tobytes())
+        with self.cacheLock:
+            response = self.cache.pop(key, None)
+            if(response is not None):
+                self.cache[key] = response
+        if(response is None):
+            item = {"name": name, "neighbours": neighbours,
+                    "directions": directions, "done": threading.Event()}
+            self.pending.put(item)
+            # Items still queued once the worker has stopped are never served
+            while(not item["done"].wait(0.1)):
+                if(not self.worker.is_alive() and not item["done"].is_set()):
+                    self._count(errors=1)
+                    raise SOFAError("Server has been closed")
+            if("error" in item):
+                self._count(errors=1)
+                raise item["error"]
+            response = item["result"]
+            with self.cacheLock:
+                self.cache[key] = response
+                while(len(self.cache) > self.cacheSize):
+                    self.cache.popitem(last=False)
+            self._count(misses=1)
+        else:
+            self._count(hits=1)
+
+        self._count(requests=1, directions=len(directions))
+        with self.metricsLock:
+            self.latencies.append(time.time() - started)
+        return response
+
+    def metrics(self):
+        with self.metricsLock:
+            latencies = np.array(self.latencies) * 1000
+            uptime = time.time() - self.started
+            metrics = dict(self.counters)
+        metrics["uptime"] = uptime
+        metrics["throughput"] = metrics["directions"] / max(uptime, 1e-9)
+        for p in [50, 95, 99]:
+            metrics["latencyP{}".format(p)] = float(
+                    np.percentile(latencies, p)) if latencies.size else 0.0
+        metrics["cacheEntries"] = len(self.cache)
+        return metrics
+
+    def files(self):
+        return {name: served.info for name, served in self.sets.items()}
+
+    def close(self):
+        self.running = False
+        self.worker.join()
+
+
+def makeHandler(server):
+    try:
+        from http.server import BaseHTTPRequestHandler
+        from urllib.parse import urlparse, parse_qs
+    except ImportError:
+        from BaseHTTPServer import BaseHTTPRequestHandler
+        from urlparse import urlparse, parse_qs
+
+    class SOFARequestHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, contentType="application/json"):
+            if(not isinstance(body, bytes)):
+                body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if(path == "/files"):
+                self._send(200, server.files())
+            elif(path == "/metrics"):
+                self._send(200, server.metrics())
+            else:
+                self._send(404, {"error": "Not found"})
+
+        def do_POST(self):
+            # POST /query/<file>?neighbours=k with JSON {"directions": ...}
+            # or little-endian float32 (azimuth, elevation) pairs
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            if(len(parts) != 2 or parts[0] != "query"):
+                return self._send(404, {"error": "Not found"})
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            try:
+                arguments = parse_qs(url.query)
+                neighbours = int(arguments.get("neighbours", [1])[0])
+                if(self.headers.get("Content-Type", "").startswith(
+                        "application/json")):
+                    request = json.loads(body.decode("utf-8"))
+                    directions = request["directions"]
+                    neighbours = int(request.get("neighbours", neighbours))
+                else:
+                    directions = np.frombuffer(body, "<f4")
+                response = server.query(parts[1], directions, neighbours)
+            except (SOFAError, ValueError, KeyError) as e:
+                return self._send(400, {"error": str(e)})
+            self._send(200, response, "application/octet-stream")
+
+        def log_message(self, *args):
+            if(server.verbose):
+                BaseHTTPRequestHandler.log_message(self, *args)
+
+    return SOFARequestHandler
+
+
+def serve(paths, host="127.0.0.1", port=8470, **kw):
+    try:
+        from http.server import HTTPServer
+        from socketserver import ThreadingMixIn
+    except ImportError:
+        from BaseHTTPServer import HTTPServer
+        from SocketServer import ThreadingMixIn
+
+    class ThreadingServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = SOFAServer(paths, **kw)
+    http = ThreadingServer((host, int(port)), makeHandler(server))
+    try:
+        http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http.server_close()
+        server.close()
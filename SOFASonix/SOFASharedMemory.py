@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFASharedMemory.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import copy
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import uuid
+import weakref
+import numpy as np
+from .SOFASonixError import SOFAError
+
+# Blocks created by this process, their tracking is left untouched
+CREATED = set()
+
+
+def _release(blocks, directory):
+    # Owner side cleanup, also runs when the manager is garbage collected
+    while(blocks):
+        block = blocks.pop()
+        # Unlink first, closing fails while views are still referenced
+        try:
+            if(sys.version_info < (3, 13)):
+                # Workers sharing our resource tracker may have unregistered
+                # the block already (see _attachBlock), register it again so
+                # the tracker has an entry to drop on unlink
+                from multiprocessing import resource_tracker
+                resource_tracker.register(block._name, "shared_memory")
+            block.unlink()
+            CREATED.discard(block.name)
+            block.close()
+        except Exception:
+            pass
+    if(directory and os.path.isdir(directory)):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _attachBlock(name):
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Older versions track attached blocks and unlink them on exit.
+        # A worker cannot tell whether its tracker is the publisher's, so
+        # this may also drop the publisher's entry: blocks are then only
+        # reclaimed by _release, not by the tracker if the owner crashes.
+        block = shared_memory.SharedMemory(name=name)
+        if(name in CREATED):
+            return block
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(block._name, "shared_memory")
+        except Exception:
+            pass
+        return block
+
+
+class SOFASharedMemory(object):
+    def __init__(self, backend="shm", minBytes=1 << 16, directory=None):
+        if(backend not in ["shm", "memmap"]):
+            raise SOFAError("Backend must either be 'shm' or 'memmap'")
+        if(backend == "shm"):
+            try:
+                from multiprocessing import shared_memory  # noqa: F401
+            except ImportError:
+                raise SOFAError("multiprocessing.shared_memory is not "
+                                "available. Please use backend='memmap'.")
+        self.backend = backend
+        self.minBytes = int(minBytes)
+        self.blocks = []
+        self.directory = tempfile.mkdtemp(prefix="sofasonix-", dir=directory)\
+            if backend == "memmap" else None
+        self.finalizer = weakref.finalize(self, _release, self.blocks,
+                                          self.directory)
+
+    def _allocate(self, value):
+        size = max(value.nbytes, 1)
+        if(self.backend == "shm"):
+            from multiprocessing import shared_memory
+            block = shared_memory.SharedMemory(create=True, size=size)
+            self.blocks.append(block)
+            CREATED.add(block.name)
+            view = np.ndarray(value.shape, value.dtype, buffer=block.buf)
+            return block.name, view
+        path = os.path.join(self.directory, "{}.dat".format(uuid.uuid4().hex))
+        view = np.lib.format.open_memmap(path, "w+", value.dtype,
+                                         value.shape)
+        return path, view
+
+    def publish(self, sofa):
+        if(not self.finalizer.alive):
+            raise SOFAError("Shared memory manager has been closed")
+        arrays = {}
+        for key, field in sofa.flatten().items():
+            value = field.value
+            if(field.isType("double") and isinstance(value, np.ndarray) and
+               value.nbytes >= self.minBytes):
+                name, view = self._allocate(value)
+                view[...] = value
+                if(self.backend == "memmap"):
+                    view.flush()
+                arrays[key] = (name, value.shape, value.dtype.str)
+
+        # Everything else travels with the descriptor
+        placeholders = {key: np.empty((0,) * len(shape))
+                        for key, (_, shape, _) in arrays.items()}
+        skeleton = sofa.copy(placeholders)
+        skeleton.dims = copy.deepcopy(sofa.dims)
+        skeleton.cache = {}
+        return {"backend": self.backend, "arrays": arrays,
+                "skeleton": pickle.dumps(skeleton, protocol=2)}
+
+    @staticmethod
+    def attach(descriptor):
+        # Read-only view of a published object, no data is copied
+        sofa = pickle.loads(descriptor["skeleton"])
+        handles = []
+        for key, (name, shape, dtype) in descriptor["arrays"].items():
+            if(descriptor["backend"] == "shm"):
+                block = _attachBlock(name)
+                handles.append(block)
+                view = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+            else:
+                view = np.load(name, mmap_mode="r")
+            view.flags.writeable = False
+            sofa.getParam(key, True).value = view
+        sofa.shared = handles
+        return sofa
+
+    def close(self):
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -46,9 +46,15 @@ import pandas as pd
 import datetime
 import os
 import gc
+import copy
+import threading
 from .SOFASonixField import SOFASonixField
+from .SOFADSP import chunks, rateRatio, resamplePolyphase
 from .SOFASonixError import SOFAError, SOFAFieldError
 
+# Serializes netCDF4 file access across threads
+IO_LOCK = threading.RLock()
+
 
 class SOFASonix(object):
     APIName = "SOFASonix"
@@ -78,6 +84,9 @@ class SOFASonix(object):
         # Set verbose
         self.verbose = True if verbose else False
 
+        # Memoized results derived from parameter values
+        self.cache = {}
+
         # Return convention data if valid params supplied.
         self.convention = self._getConvention(conv, sofaConventionsVersion,
                                               version)
@@ -395,67 +404,103 @@ class SOFASonix(object):
 
     @staticmethod
     def load(file, verbose=True):
-        gc.collect()
-        raw = netCDF4.Dataset(file, "r", "NETCDF4")
-        # Try to find a convention
-        try:
-            convention = raw.SOFAConventions
-            version = float(raw.SOFAConventionsVersion)
-            specversion = float(raw.Version)
-        except Exception:
-            raise SOFAError("Invalid SOFA file. No convention specified.")
-
-        # Create a convention file.
-        sofa = SOFASonix(convention, version, specversion, load=True,
-                         verbose=verbose)
-
-        # Set dimensions if applicable
-        for dim in raw.dimensions:
-            if(dim in sofa.dims.keys()):
-                sofa.setDim(dim, len(raw.dimensions[dim]), force=True)
-
-        # Populate with datasets and attributes - single dimension (sufficient)
-        for key in raw.variables:
-            # Empty check
-            if(raw[key].shape is not None):
-                dat = np.array(raw[key][:].tolist())
-                sofa.setParam(key, dat, force=True)
-            # Check for attributes
-            for attr in raw[key].ncattrs():
-                attribute = getattr(raw[key], attr)
+        # Directories are chunked stores
+        if(os.path.isdir(file)):
+            from .SOFAStore import SOFAStore
+            return SOFAStore(file).load(verbose)
+        # netCDF4/HDF5 calls are not thread-safe
+        with IO_LOCK:
+            gc.collect()
+            raw = netCDF4.Dataset(file, "r", "NETCDF4")
+            # Try to find a convention
+            try:
+                convention = raw.SOFAConventions
+                version = float(raw.SOFAConventionsVersion)
+                specversion = float(raw.Version)
+            except Exception:
+                raise SOFAError("Invalid SOFA file. No convention specified.")
+
+            # Create a convention file.
+            sofa = SOFASonix(convention, version, specversion, load=True,
+                             verbose=verbose)
+
+            # Set dimensions if applicable
+            for dim in raw.dimensions:
+                if(dim in sofa.dims.keys()):
+                    sofa.setDim(dim, len(raw.dimensions[dim]), force=True)
+
+            # Populate with datasets and attributes - single dimension
+            # (sufficient)
+            for key in raw.variables:
+                # Empty check
+                if(raw[key].shape is not None):
+                    dat = np.array(raw[key][:].tolist())
+                    sofa.setParam(key, dat, force=True)
+                # Check for attributes
+                for attr in raw[key].ncattrs():
+                    attribute = getattr(raw[key], attr)
+                    if(attribute):
+                        paramName = "{}:{}".format(key, attr)
+                        try:
+                            sofa.setParam(paramName,
+                                          attribute,
+                                          force=True)
+                        except Exception as e:
+                            raise Exception(e)
+
+            # Match dimension strings for unclassed params
+            if("__unclassed" in sofa.params):
+                for param in sofa.params["__unclassed"].values():
+                    param._matchDims()
+
+            # Now set global attributes
+            for attr in raw.ncattrs():
+                # Empty check
+                attribute = getattr(raw, attr)
                 if(attribute):
-                    paramName = "{}:{}".format(key, attr)
                     try:
-                        sofa.setParam(paramName,
+                        sofa.setParam("GLOBAL:{}".format(attr),
                                       attribute,
                                       force=True)
                     except Exception as e:
                         raise Exception(e)
 
-        # Match dimension strings for unclassed params
-        if("__unclassed" in sofa.params):
-            for param in sofa.params["__unclassed"].values():
-                param._matchDims()
-
-        # Now set global attributes
-        for attr in raw.ncattrs():
-            # Empty check
-            attribute = getattr(raw, attr)
-            if(attribute):
-                try:
-                    sofa.setParam("GLOBAL:{}".format(attr),
-                                  attribute,
-                                  force=True)
-                except Exception as e:
-                    raise Exception(e)
-
-        # If modified (foreign parameters), add modified to convention name
-        if(sofa.modified):
-            sofa.getParam("GLOBAL:SOFAConventions").value += " (modified)"
-
-        # Close h5py file and return SOFASonix object
-        raw.close()
-        del raw
+            # If modified (foreign parameters), add modified to convention name
+            if(sofa.modified):
+                sofa.getParam("GLOBAL:SOFAConventions").value += " (modified)"
+
+            # Close h5py file and return SOFASonix object
+            raw.close()
+            del raw
+            return sofa
+
+    def copy(self, values=None):
+        values = values or {}
+        sofa = SOFASonix(self.convention["name"],
+                         self.convention["SOFAConventionsVersion"],
+                         self.convention["spec_version"],
+                         load=True, verbose=False)
+        sofa.dims = copy.deepcopy(self.dims)
+
+        # Clone fields, replaced values are not copied
+        params = {}
+        for category, fields in self.params.items():
+            params[category] = {}
+            for key, field in fields.items():
+                clone = copy.copy(field)
+                clone.parent = sofa
+                if(key not in values):
+                    clone.value = copy.deepcopy(field.value)
+                    if(field.isType("string")):
+                        clone.paddedValue = copy.deepcopy(field.paddedValue)
+                params[category][key] = clone
+        sofa.params = params
+        sofa.modified = self.modified
+
+        # Assign replacement values, updating dimensions where defined
+        for key, value in values.items():
+            sofa.setParam(key, value)
+        sofa.verbose = self.verbose
         return sofa
 
     def getDim(self, dim):
@@ -521,7 +566,7 @@ class SOFASonix(object):
                                 maxS = max(map(len, value))
                                 # Create an array to store the values
                                 stringArray = np.zeros((len(value), maxS),
-                                                       dtype=np.string_)
+                                                       dtype=np.bytes_)
                                 # Append values
                                 for i in value:
                                     iv = list(i)
@@ -620,7 +665,7 @@ class SOFASonix(object):
                                          "insert a valid string, list or "
                                          "numpy array.""")
                 # Check if character array or numerical
-                if(np.issubdtype(value.dtype, np.string_)):
+                if(np.issubdtype(value.dtype, np.bytes_)):
                     inputType = "string"
                 else:
                     inputType = "double"
@@ -681,6 +726,92 @@ class SOFASonix(object):
         else:
             print("No parameter '{}' found to delete.".format(param))
 
+    def cached(self, name, key, fields, compute):
+        # Entries are dropped once any of the fields receives a new value
+        # or is visibly edited in place (see SOFASonixField.contentState)
+        params = [self.getParam(f, True) for f in fields]
+        state = tuple((id(p), p.revision, p.contentState()) for p in params)
+        if(name not in self.cache or self.cache[name]["state"] != state):
+            self.cache[name] = {"state": state, "values": {}}
+        values = self.cache[name]["values"]
+        if(key not in values):
+            value = compute()
+            if(isinstance(value, np.ndarray)):
+                value.flags.writeable = False
+            values[key] = value
+        return values[key]
+
+    def memoryUsage(self):
+        # Bytes held by field arrays and cached results
+        arrays = {}
+        for field in self.flatten().values():
+            for value in [field.value, getattr(field, "paddedValue", None)]:
+                if(isinstance(value, np.ndarray)):
+                    arrays[id(value)] = value.nbytes
+        # Copies, other threads may add entries while this is measured
+        for entry in list(self.cache.values()):
+            for value in list(entry["values"].values()):
+                if(isinstance(value, np.ndarray)):
+                    arrays[id(value)] = value.nbytes
+        return sum(arrays.values())
+
+    def spectrum(self, nfft=None, magnitude=False, single=False):
+        try:
+            ir = self.getParam("Data.IR", True)
+            self.getParam("Data.SamplingRate", True)
+        except SOFAFieldError:
+            raise SOFAError("Convention '{}' does not provide 'Data.IR'"
+                            .format(self.convention["name"]))
+        if(ir.isEmpty()):
+            raise SOFAError("'Data.IR' is empty")
+        nfft = ir.value.shape[-1] if nfft is None else int(nfft)
+        if(nfft <= 0):
+            raise SOFAError("nfft must be a positive integer")
+
+        def transform():
+            # One batched transform over all measurements and receivers
+            if(magnitude):
+                return np.abs(self.spectrum(nfft, False, single))
+            data = ir.value.astype(np.float32) if single else ir.value
+            spectra = np.fft.rfft(data, nfft, axis=-1)
+            return spectra.astype(np.complex64, copy=False) if single\
+                else spectra
+
+        return self.cached("spectrum", (nfft, bool(magnitude), bool(single)),
+                           ["Data.IR", "Data.SamplingRate"], transform)
+
+    def frequencies(self, nfft=None):
+        rate = float(np.ravel(self.getParam("Data.SamplingRate"))[0])
+        nfft = self.getParam("Data.IR").shape[-1] if nfft is None\
+            else int(nfft)
+        return np.fft.rfftfreq(nfft, 1.0 / rate)
+
+    def resample(self, samplingRate, chunk=None):
+        try:
+            ir = self.getParam("Data.IR")
+            rate = float(np.ravel(self.getParam("Data.SamplingRate"))[0])
+        except SOFAFieldError:
+            raise SOFAError("Convention '{}' does not provide 'Data.IR'"
+                            .format(self.convention["name"]))
+        if(float(samplingRate) <= 0):
+            raise SOFAError("Sampling rate must be positive")
+        up, down = rateRatio(rate, samplingRate)
+        if(up == down):
+            return self
+
+        # Resample all measurements and receivers, chunked over M
+        length = int(np.ceil(ir.shape[-1] * up / float(down)))
+        result = np.empty(ir.shape[:-1] + (length,))
+        for part in chunks(ir.shape[0], chunk):
+            result[part] = resamplePolyphase(ir[part], up, down)
+
+        # Delays are stored in samples
+        delay = self.getParam("Data.Delay")
+        self.setParam("Data.IR", result)
+        self.setParam("Data.Delay", delay * up / float(down))
+        self.setParam("Data.SamplingRate", np.array([rate * up / down]))
+        return self
+
     def validate(self, category=False):
         params = self.params[category].items() if category else\
             self.flatten().items()
@@ -693,7 +824,29 @@ class SOFASonix(object):
                 param.checkRequirements()
                 param.checkValueConstraints()
 
-    def export(self, filename):
+    @staticmethod
+    def diff(a, b, rtol=0.0, atol=0.0, ignore=("GLOBAL:DateModified",),
+             chunkBytes=None):
+        # Compare objects or files chunk by chunk
+        from .SOFADiff import diff
+        from .SOFAHash import CHUNK_BYTES
+        return diff(a, b, rtol, atol, ignore, chunkBytes or CHUNK_BYTES)
+
+    @staticmethod
+    def aload(file, verbose=False, timeout=None, executor=None):
+        # Awaitable load on a bounded I/O executor
+        from .SOFAAsync import aload
+        return aload(file, verbose, timeout, executor)
+
+    def aexport(self, filename, timeout=None, executor=None):
+        from .SOFAAsync import aexport
+        return aexport(self, filename, timeout, executor)
+
+    def export(self, filename, compression=None, backend="netcdf",
+               chunkSize=None, workers=None):
+        if(backend not in ["netcdf", "store"]):
+            raise SOFAError("Backend must either be 'netcdf' or 'store'")
+
         # Perform field-by-field validation
         for category in self.params:
             self.validate(category)
@@ -704,54 +857,68 @@ class SOFASonix(object):
         except SOFAFieldError:
             pass
 
-        # Create file and attempt saving.
-        file = netCDF4.Dataset("{}.sofa".format(filename), "w",
-                               format="NETCDF4")
+        if(backend == "store"):
+            from .SOFAStore import SOFAStore, SUFFIX
+            SOFAStore.create(self, "{}{}".format(filename, SUFFIX),
+                             chunkSize, workers)
+            return
 
-        try:
-            # Create dimensions
-            for dim in self.dims.keys():
-                file.createDimension(dim, self.dims[dim]["value"])
-
-            attributes = self.flatten()
-            # Extract doubles.
-            doubles = {k: attributes.pop(k) for k in list(attributes.keys())
-                       if attributes[k].isType("double")}
-
-            # Extract strings
-            strings = {k: attributes.pop(k) for k in list(attributes.keys())
-                       if attributes[k].isType("string")}
-
-            # Create all doubles first.
-            for key, element in doubles.items():
-                if(not element.isEmpty()):
-                    var = file.createVariable(key, "f8",
-                                              element.getDimensions())
-                    var[:] = element.value
-
-            # Create strings
-            for key, element in strings.items():
-                if(not element.isEmpty()):
-                    var = file.createVariable(key, "S1",
-                                              element.getDimensions())
-                    var[:] = element.paddedValue
-
-            # Create attributes
-            for key, element in attributes.items():
-                variable, attrname = key.split(":") if (":" in key)\
-                    else ["global", key]
-                # For global attributes, create in root
-                if(key in self.params["global"] or
-                   variable.lower() == "global"):
-                    setattr(file, attrname, element.value)
-                # Otherwise create the attribute within the variable
-                else:
-                    setattr(file[variable], attrname, element.value)
-            file.close()
-        except Exception:
-            # Close file if errors encountered and re-raise exception.
-            file.close()
-            raise
+        with IO_LOCK:
+            # Create file and attempt saving.
+            file = netCDF4.Dataset("{}.sofa".format(filename), "w",
+                                   format="NETCDF4")
+
+            try:
+                # Create dimensions
+                for dim in self.dims.keys():
+                    file.createDimension(dim, self.dims[dim]["value"])
+
+                attributes = self.flatten()
+                # Extract doubles.
+                doubles = {k: attributes.pop(k)
+                           for k in list(attributes.keys())
+                           if attributes[k].isType("double")}
+
+                # Extract strings
+                strings = {k: attributes.pop(k)
+                           for k in list(attributes.keys())
+                           if attributes[k].isType("string")}
+
+                # Optional zlib compression level (1-9) of numeric data
+                options = {"zlib": True, "complevel": int(compression)}\
+                    if compression else {}
+
+                # Create all doubles first.
+                for key, element in doubles.items():
+                    if(not element.isEmpty()):
+                        var = file.createVariable(key, "f8",
+                                                  element.getDimensions(),
+                                                  **options)
+                        var[:] = element.value
+
+                # Create strings
+                for key, element in strings.items():
+                    if(not element.isEmpty()):
+                        var = file.createVariable(key, "S1",
+                                                  element.getDimensions())
+                        var[:] = element.paddedValue
+
+                # Create attributes
+                for key, element in attributes.items():
+                    variable, attrname = key.split(":") if (":" in key)\
+                        else ["global", key]
+                    # For global attributes, create in root
+                    if(key in self.params["global"] or
+                       variable.lower() == "global"):
+                        setattr(file, attrname, element.value)
+                    # Otherwise create the attribute within the variable
+                    else:
+                        setattr(file[variable], attrname, element.value)
+                file.close()
+            except Exception:
+                # Close file if errors encountered and re-raise exception.
+                file.close()
+                raise
 
     def view(self):
         cols = ["Shorthand", "Type", "Value", "RO", "M", "Dims"]
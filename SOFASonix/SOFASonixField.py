@@ -40,14 +40,24 @@
 
 from .SOFASonixError import SOFAFieldError, SOFAError
 import numpy as np
+import zlib
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd
 
+# Elements sampled when checking an array for in-place edits
+CONTENT_SAMPLES = 4096
 
-class SOFASonixField:
+
+class SOFASonixField(object):
     def __init__(self, parent, name, pclass, units, params):
         self.name = name
         self.parameter_class = pclass
         self.parent = parent
         self.units = units
+        # Incremented whenever a new value is assigned
+        self.revision = 0
         # Set parameters
         for key, value in params.items():
             setattr(self, key, value)
@@ -56,6 +66,15 @@ class SOFASonixField:
         if(self.isType("string")):
             self.paddedValue = value
 
+    @property
+    def value(self):
+        return self.__dict__.get("_value")
+
+    @value.setter
+    def value(self, value):
+        self.__dict__["_value"] = value
+        self.revision = self.__dict__.get("revision", 0) + 1
+
     def isType(self, type_str):
         return self.type.lower() == str(type_str).lower()
 
@@ -71,6 +90,21 @@ class SOFASonixField:
     def isTimestamp(self):
         return True if self.timestamp else False
 
+    def contentState(self):
+        # Buffer address and checksum of evenly strided elements. Catches
+        # reassignment and edits spread over the array, but edits touching
+        # only a few unsampled elements go unnoticed.
+        value = self.value
+        if(not isinstance(value, np.ndarray) or not value.size):
+            return None
+        # A stride coprime to the last axis visits every column
+        step = max(value.size // CONTENT_SAMPLES, 1)
+        while(gcd(step, value.shape[-1]) != 1):
+            step += 1
+        sample = value.reshape(-1)[::step]
+        return (value.__array_interface__["data"][0],
+                zlib.crc32(np.ascontiguousarray(sample).tobytes()))
+
     def isEmpty(self):
         size = len(self.value) if self.isType("attribute") or\
             self.isType("string") else self.value.size
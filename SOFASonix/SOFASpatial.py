@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFASpatial.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import numpy as np
+from .SOFASonixError import SOFAError
+
+
+def sphericalToCartesian(positions):
+    positions = np.asarray(positions, dtype=float)
+    azimuth = np.radians(positions[..., 0])
+    elevation = np.radians(positions[..., 1])
+    # Assume unit radius if only angles are supplied
+    radius = positions[..., 2] if positions.shape[-1] > 2 else 1.0
+    return np.stack([radius * np.cos(elevation) * np.cos(azimuth),
+                     radius * np.cos(elevation) * np.sin(azimuth),
+                     radius * np.sin(elevation) * np.ones_like(azimuth)],
+                    axis=-1)
+
+
+def cartesianToSpherical(positions):
+    positions = np.asarray(positions, dtype=float)
+    x, y, z = positions[..., 0], positions[..., 1], positions[..., 2]
+    radius = np.sqrt(x ** 2 + y ** 2 + z ** 2)
+    azimuth = np.degrees(np.arctan2(y, x)) % 360
+    elevation = np.degrees(np.arctan2(z, np.sqrt(x ** 2 + y ** 2)))
+    return np.stack([azimuth, elevation, radius], axis=-1)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=float)
+    norm = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    # Leave zero vectors untouched
+    return vectors / np.where(norm > 0, norm, 1)
+
+
+def getPositions(sofa, key="SourcePosition", cartesian=True):
+    positions = np.asarray(sofa.getParam(key), dtype=float)
+    try:
+        coordinates = sofa.getParam("{}:Type".format(key)).lower()
+    except Exception:
+        coordinates = "cartesian"
+    if(coordinates not in ["cartesian", "spherical"]):
+        raise SOFAError("Unsupported coordinate type '{}' for '{}'"
+                        .format(coordinates, key))
+
+    # Broadcast IC to MC
+    if(positions.ndim == 2 and positions.shape[0] == 1):
+        positions = np.repeat(positions, sofa.getDim("M"), axis=0)
+
+    if(cartesian and coordinates == "spherical"):
+        return sphericalToCartesian(positions)
+    elif(not cartesian and coordinates == "cartesian"):
+        return cartesianToSpherical(positions)
+    return positions
+
+
+def getDirections(sofa, key="SourcePosition"):
+    return normalize(getPositions(sofa, key))
+
+
+def chordToAngle(distances):
+    return 2 * np.arcsin(np.clip(distances / 2.0, 0, 1))
+
+
+class SOFASpatialIndex(object):
+    # Queries per chunk, keeps candidate arrays bounded
+    CHUNK = 4096
+
+    def __init__(self, directions, cellSize=None):
+        self.points = normalize(directions).reshape(-1, 3)
+        self.size = self.points.shape[0]
+        if(self.size == 0):
+            raise SOFAError("Cannot index an empty set of directions")
+
+        # Cells are sized for a handful of points each on the unit sphere
+        if(cellSize is None):
+            cellSize = np.sqrt(16.0 / self.size)
+        self.cellSize = float(np.clip(cellSize, 1e-3, 2.0))
+        self.cells = int(np.floor(2.0 / self.cellSize)) + 1
+
+        # Sort points by cell key for range lookups
+        keys = self._keys(self._cells(self.points))
+        self.order = np.argsort(keys, kind="mergesort")
+        self.keys = keys[self.order]
+
+        offsets = np.array(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1],
+                                       indexing="ij")).reshape(3, -1).T
+        self.offsets = offsets
+
+    def _cells(self, points):
+        cells = np.floor((points + 1.0) / self.cellSize).astype(np.int64)
+        return np.clip(cells, 0, self.cells - 1)
+
+    def _keys(self, cells):
+        return (cells[..., 0] * self.cells + cells[..., 1]) * self.cells\
+            + cells[..., 2]
+
+    def query(self, directions, k=1):
+        directions = normalize(directions)
+        shape = directions.shape[:-1]
+        directions = directions.reshape(-1, 3)
+        k = int(min(k, self.size))
+
+        distances = np.empty((directions.shape[0], k))
+        indices = np.empty((directions.shape[0], k), dtype=np.int64)
+        for start in range(0, directions.shape[0], SOFASpatialIndex.CHUNK):
+            chunk = slice(start, start + SOFASpatialIndex.CHUNK)
+            distances[chunk], indices[chunk] = self._query(directions[chunk],
+                                                           k)
+
+        # Convert chord lengths to great-circle angles (radians)
+        return (chordToAngle(distances).reshape(shape + (k,)),
+                indices.reshape(shape + (k,)))
+
+    def _query(self, directions, k):
+        # Neighbouring cell keys of every query - (Q, 27)
+        cells = self._cells(directions)[:, np.newaxis, :] + self.offsets
+        valid = np.all((cells >= 0) & (cells < self.cells), axis=-1)
+        keys = self._keys(np.clip(cells, 0, self.cells - 1))
+
+        lower = np.searchsorted(self.keys, keys, "left")
+        upper = np.searchsorted(self.keys, keys, "right")
+        counts = np.where(valid, upper - lower, 0).ravel()
+
+        # Flatten candidates of all neighbouring cells into (query, point)
+        # pairs so that dense cells do not inflate the other queries
+        total = int(counts.sum())
+        queries = np.repeat(np.arange(counts.size) // self.offsets.shape[0],
+                            counts)
+        slots = np.repeat(lower.ravel() - np.cumsum(counts) + counts,
+                          counts) + np.arange(total)
+        candidates = self.order[slots]
+        dots = np.einsum("ij,ij->i", directions[queries],
+                         self.points[candidates])
+        distances = np.sqrt(np.clip(2.0 - 2.0 * dots, 0, None))
+
+        # Sort pairs by query, then distance, and keep the first k per query
+        found = np.bincount(queries, minlength=directions.shape[0])
+        rank = np.arange(k)
+        mask = rank < found[:, np.newaxis]
+        picks = np.zeros(mask.shape, dtype=np.int64)
+        if(total):
+            order = np.lexsort((distances, queries))
+            first = np.cumsum(found) - found
+            picks = order[np.where(mask, first[:, np.newaxis] + rank, 0)]
+            distances = np.where(mask, distances[picks], np.inf)
+            candidates = candidates[picks]
+        else:
+            distances = np.full(mask.shape, np.inf)
+            candidates = picks
+
+        # Every point within one cell size has been searched. Fall back to an
+        # exhaustive search for queries whose neighbours may lie further out.
+        failed = np.flatnonzero(distances[:, -1] > self.cellSize)
+        if(failed.size):
+            dots = np.dot(directions[failed], self.points.T)
+            exhaustive = np.sqrt(np.clip(2.0 - 2.0 * dots, 0, None))
+            everything = np.broadcast_to(np.arange(self.size),
+                                         exhaustive.shape)
+            distances[failed], candidates[failed] = self._select(
+                    exhaustive, everything, k)
+        return distances, candidates
+
+    def _select(self, distances, candidates, k):
+        if(distances.shape[1] > k):
+            part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(distances, part, axis=1)
+            candidates = np.take_along_axis(candidates, part, axis=1)
+        order = np.argsort(distances, axis=1, kind="mergesort")
+        return (np.take_along_axis(distances, order, axis=1),
+                np.take_along_axis(candidates, order, axis=1))
+
+
+def interpolationWeights(distances, power=1.0):
+    # Inverse distance weighting, exact matches take all the weight
+    distances = np.asarray(distances, dtype=float)
+    exact = distances <= 1e-7
+    weights = 1.0 / np.maximum(distances, 1e-9) ** power
+    weights = np.where(np.any(exact, axis=-1, keepdims=True),
+                       exact.astype(float), weights)
+    return weights / weights.sum(axis=-1, keepdims=True)
+
+
+def solidAngleWeights(directions, neighbours=6):
+    # Approximate the solid angle of each point from its neighbour spacing
+    directions = normalize(directions).reshape(-1, 3)
+    if(directions.shape[0] < 2):
+        return np.ones(directions.shape[0])
+    k = min(int(neighbours), directions.shape[0] - 1)
+    distances, _ = SOFASpatialIndex(directions).query(directions, k + 1)
+    spacing = np.mean(distances[:, 1:], axis=-1)
+    weights = spacing ** 2
+    total = weights.sum()
+    return weights / total if total > 0 else\
+        np.full(weights.shape, 1.0 / weights.size)
+
+
+def fibonacciGrid(points):
+    # Near-uniform spiral of unit directions
+    points = int(points)
+    if(points < 1):
+        raise SOFAError("A grid requires at least one point")
+    index = np.arange(points) + 0.5
+    z = 1.0 - 2.0 * index / points
+    azimuth = np.pi * (1.0 + np.sqrt(5.0)) * index
+    radius = np.sqrt(1.0 - z ** 2)
+    return np.stack([radius * np.cos(azimuth), radius * np.sin(azimuth), z],
+                    axis=-1)
+
+
+def equiangularGrid(azimuthStep, elevationStep=None, elevationRange=(-90, 90)):
+    elevationStep = azimuthStep if elevationStep is None else elevationStep
+    if(azimuthStep <= 0 or elevationStep <= 0):
+        raise SOFAError("Grid steps must be positive")
+    elevation = np.arange(elevationRange[0], elevationRange[1] + 1e-9,
+                          elevationStep)
+    azimuth = np.arange(0, 360 - 1e-9, azimuthStep)
+    grid = np.array(np.meshgrid(azimuth, elevation)).reshape(2, -1).T
+    # Poles only need a single direction
+    poles = np.abs(grid[:, 1]) >= 90 - 1e-9
+    keep = ~poles | (grid[:, 0] == 0)
+    return sphericalToCartesian(grid[keep])
+
+
+# Lebedev orbits (generator, parameters) and weights per number of points
+LEBEDEV = {6: [("a1", (), 1.0 / 6)],
+           14: [("a1", (), 1.0 / 15), ("a3", (), 0.075)],
+           26: [("a1", (), 1.0 / 21), ("a2", (), 4.0 / 105),
+                ("a3", (), 9.0 / 280)],
+           38: [("a1", (), 1.0 / 105), ("a3", (), 9.0 / 280),
+                ("c1", (0.4597008433809831,), 1.0 / 35)],
+           50: [("a1", (), 4.0 / 315), ("a2", (), 64.0 / 2835),
+                ("a3", (), 27.0 / 1280),
+                ("b1", (0.3015113445777636,), 14641.0 / 725760)]}
+
+
+def _lebedevOrbit(generator, parameters):
+    if(generator == "a1"):
+        base = [(1, 0, 0)]
+    elif(generator == "a2"):
+        base = [(0, 1, 1)]
+    elif(generator == "a3"):
+        base = [(1, 1, 1)]
+    elif(generator == "b1"):
+        x = parameters[0]
+        base = [(x, x, np.sqrt(1 - 2 * x ** 2))]
+    else:
+        p = parameters[0]
+        base = [(p, np.sqrt(1 - p ** 2), 0)]
+    base = normalize(base)[0]
+
+    # All signed permutations of the generator, duplicates removed
+    permutations = [(0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1),
+                    (2, 1, 0)]
+    signs = np.array(np.meshgrid([-1, 1], [-1, 1], [-1, 1])).reshape(3, -1).T
+    orbit = (base[list(permutations)][:, np.newaxis, :] * signs).reshape(-1, 3)
+    _, unique = np.unique(np.round(orbit, 12), axis=0, return_index=True)
+    return orbit[np.sort(unique)]
+
+
+def lebedevGrid(points, weights=False):
+    if(int(points) not in LEBEDEV):
+        raise SOFAError("Lebedev grids are available for {} points"
+                        .format(sorted(LEBEDEV)))
+    directions, quadrature = [], []
+    for generator, parameters, weight in LEBEDEV[int(points)]:
+        orbit = _lebedevOrbit(generator, parameters)
+        directions.append(orbit)
+        quadrature.append(np.full(orbit.shape[0], weight))
+    directions = np.concatenate(directions)
+    if(weights):
+        return directions, np.concatenate(quadrature)
+    return directions
+
+
+def sphericalHarmonics(order, directions, normalization="sn3d"):
+    # Real spherical harmonics in ACN order - (..., (order + 1) ** 2)
+    if(normalization not in ["sn3d", "n3d"]):
+        raise SOFAError("Normalization must either be 'sn3d' or 'n3d'")
+    order = int(order)
+    directions = normalize(directions)
+    x, y, z = directions[..., 0], directions[..., 1], directions[..., 2]
+    azimuth = np.arctan2(y, x)
+    cosine = np.sqrt(np.clip(1.0 - z ** 2, 0, None))
+
+    # Associated Legendre functions without the Condon-Shortley phase
+    legendre = {(0, 0): np.ones_like(z)}
+    for m in range(1, order + 1):
+        legendre[(m, m)] = legendre[(m - 1, m - 1)] * (2 * m - 1) * cosine
+    for m in range(order):
+        legendre[(m + 1, m)] = z * (2 * m + 1) * legendre[(m, m)]
+        for n in range(m + 2, order + 1):
+            legendre[(n, m)] = ((2 * n - 1) * z * legendre[(n - 1, m)] -
+                                (n + m - 1) * legendre[(n - 2, m)]) / (n - m)
+
+    harmonics = []
+    for n in range(order + 1):
+        for m in range(-n, n + 1):
+            a = abs(m)
+            scale = np.exp(0.5 * (np.sum(np.log(np.arange(1, n - a + 1))) -
+                                  np.sum(np.log(np.arange(1, n + a + 1)))))
+            scale *= np.sqrt(2.0) if m else 1.0
+            if(normalization == "n3d"):
+                scale *= np.sqrt(2 * n + 1)
+            angular = np.cos(m * azimuth) if m >= 0 else\
+                np.sin(a * azimuth)
+            harmonics.append(scale * legendre[(n, a)] * angular)
+    return np.stack(harmonics, axis=-1)
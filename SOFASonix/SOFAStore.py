@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, I.Laghidze
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of SOFASonix nor the names of its contributors
+#       may be used to endorse or promote products derived from this software
+#       without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# =============================================================================
+#
+#                           File: SOFAStore.py
+#                           Project: SOFASonix
+#                           Author: I.Laghidze
+#                           License: BSD 3
+#
+# =============================================================================
+
+import json
+import os
+import numpy as np
+from .SOFASonixError import SOFAError
+
+FORMAT = "sofasonix-store"
+SUFFIX = ".sofastore"
+METADATA = "metadata.json"
+# Target size of a chunk along M
+CHUNK_BYTES = 1 << 23
+
+
+def _map(function, items, workers):
+    items = list(items)
+    if(workers and int(workers) > 1 and len(items) > 1):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=int(workers)) as pool:
+            return list(pool.map(function, items))
+    return [function(item) for item in items]
+
+
+class SOFAStore(object):
+    # Directory of JSON metadata and one .npy file per chunk. Chunks of
+    # different measurement blocks can be read and written concurrently.
+    def __init__(self, directory):
+        self.directory = directory
+        path = os.path.join(directory, METADATA)
+        if(not os.path.isfile(path)):
+            raise SOFAError("'{}' is not a SOFASonix store".format(directory))
+        with open(path, "r") as f:
+            self.metadata = json.load(f)
+        if(self.metadata.get("format") != FORMAT):
+            raise SOFAError("Unsupported store format '{}'"
+                            .format(self.metadata.get("format")))
+        self.variables = self.metadata["variables"]
+
+    @staticmethod
+    def create(sofa, directory, chunkSize=None, workers=None):
+        params = sofa.flatten()
+        measurements = sofa.getDim("M")
+        variables, arrays = {}, {}
+        for key, field in params.items():
+            if(field.isEmpty() or not (field.isType("double") or
+                                       field.isType("string"))):
+                continue
+            string = field.isType("string")
+            value = np.asarray(field.paddedValue if string else field.value,
+                               dtype="S1" if string else float)
+            dimensions = list(field.getDimensions())
+
+            # Only variables leading with M are split into chunks
+            rows = value.shape[0] if value.ndim else 1
+            if(value.ndim and dimensions[0] == "M" and
+               rows == measurements):
+                rowBytes = max(value[0].nbytes, 1)
+                size = int(chunkSize) if chunkSize else\
+                    max(CHUNK_BYTES // rowBytes, 1)
+            else:
+                size = max(rows, 1)
+            variables[key] = {"dimensions": dimensions,
+                              "shape": list(value.shape),
+                              "dtype": value.dtype.str, "chunk": size,
+                              "chunks": max(int(np.ceil(rows /
+                                                        float(size))), 1)}
+            arrays[key] = value
+
+        metadata = {"format": FORMAT, "version": 1,
+                    "convention": sofa.convention["name"],
+                    "conventionVersion":
+                        sofa.convention["SOFAConventionsVersion"],
+                    "specVersion": sofa.convention["spec_version"],
+                    "dimensions": {k: v["value"]
+                                   for k, v in sofa.dims.items()},
+                    "attributes": {k: str(v.value)
+                                   for k, v in params.items()
+                                   if v.isType("attribute") and v.value},
+                    "variables": variables}
+
+        if(not os.path.isdir(directory)):
+            os.makedirs(directory)
+        store = SOFAStore.__new__(SOFAStore)
+        store.directory = directory
+        store.metadata = metadata
+        store.variables = variables
+        tasks = [(key, i) for key in variables
+                 for i in range(variables[key]["chunks"])]
+        _map(lambda task: store.writeChunk(task[0], task[1], store._slice(
+                arrays[task[0]], task[0], task[1])), tasks, workers)
+
+        # Metadata is written last, an incomplete store cannot be opened
+        store._writeFile(METADATA, lambda f: f.write(
+                json.dumps(metadata, indent=2).encode("utf-8")))
+        return store
+
+    def _slice(self, value, key, index):
+        if(not value.ndim):
+            return value
+        size = self.variables[key]["chunk"]
+        return value[index * size:(index + 1) * size]
+
+    def _path(self, key, index):
+        return os.path.join(self.directory, "variables", key,
+                            "{:06d}.npy".format(index))
+
+    def _writeFile(self, name, write):
+        # Atomic replace so concurrent readers never see partial chunks
+        path = os.path.join(self.directory, name)
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, "wb") as f:
+            write(f)
+        os.rename(temporary, path) if os.name != "nt" else\
+            os.replace(temporary, path)
+
+    def writeChunk(self, key, index, values):
+        info = self.variables[key]
+        values = np.asarray(values, dtype=np.dtype(info["dtype"]))
+        expected = list(info["shape"][1:]) if info["shape"] else []
+        if(info["shape"] and list(values.shape[1:]) != expected):
+            raise SOFAError("Chunk shape {} does not match '{}' {}"
+                            .format(values.shape, key, info["shape"]))
+        folder = os.path.join(self.directory, "variables", key)
+        if(not os.path.isdir(folder)):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                pass
+        self._writeFile(os.path.relpath(self._path(key, index),
+                                        self.directory),
+                        lambda f: np.save(f, values))
+
+    def readChunk(self, key, index):
+        return np.load(self._path(key, index))
+
+    def read(self, key, index=None, workers=None):
+        # Rows start:stop along the first axis, reading only their chunks
+        info = self.variables[key]
+        if(not info["shape"]):
+            return self.readChunk(key, 0)
+        rows = info["shape"][0]
+        start, stop, _ = (index or slice(None)).indices(rows)
+        size = info["chunk"]
+        chunks = range(start // size, (max(stop, start + 1) - 1) // size + 1)
+        parts = _map(lambda i: self.readChunk(key, i), chunks, workers)
+        if(not parts):
+            return np.empty([0] + info["shape"][1:], info["dtype"])
+        data = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        offset = chunks[0] * size
+        return data[start - offset:stop - offset]
+
+    def load(self, verbose=False, workers=None):
+        from .SOFASonix import SOFASonix
+        metadata = self.metadata
+        sofa = SOFASonix(metadata["convention"],
+                         metadata["conventionVersion"],
+                         metadata["specVersion"], load=True,
+                         verbose=verbose)
+        for dim, value in metadata["dimensions"].items():
+            if(dim in sofa.dims):
+                sofa.setDim(dim, value, force=True)
+
+        # Same order as loading a netCDF file: variables, their attributes
+        # and the global attributes last
+        keys = sorted(self.variables)
+        values = _map(lambda key: self.read(key, workers=None), keys,
+                      workers)
+        for key, value in zip(keys, values):
+            sofa.setParam(key, value, force=True)
+        attributes = metadata["attributes"]
+        for key in sorted(attributes):
+            if(not key.startswith("GLOBAL:")):
+                sofa.setParam(key, attributes[key], force=True)
+        if("__unclassed" in sofa.params):
+            for param in sofa.params["__unclassed"].values():
+                param._matchDims()
+        for key in sorted(attributes):
+            if(key.startswith("GLOBAL:")):
+                sofa.setParam(key, attributes[key], force=True)
+        return sofa
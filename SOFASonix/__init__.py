@@ -1,2 +1,15 @@
 from .SOFASonix import SOFASonix as SOFAFile
-from .SOFATemplate import SOFATemplate as TemplateGenerator
\ No newline at end of file
+from .SOFATemplate import SOFATemplate as TemplateGenerator
+from .SOFAConvolver import SOFAConvolver as Convolver
+from .SOFARenderer import SOFADynamicRenderer as DynamicRenderer
+from .SOFARenderer import SOFAMultiSourceRenderer as MultiSourceRenderer
+from .SOFAConverter import convert
+from .SOFAEqualizer import SOFAEqualizer as Equalizer
+from .SOFACompare import compare
+from .SOFADirectivity import SOFADirectivity as Directivity
+from .SOFAAmbisonics import SOFAAmbisonicEncoder as AmbisonicEncoder
+from .SOFACache import SOFACache as Cache
+from .SOFASharedMemory import SOFASharedMemory as SharedMemory
+from .SOFACatalog import SOFACatalog as Catalog
+from .SOFAStore import SOFAStore as Store
+from .SOFAArrow import exportArrow, exportParquet
@@ -40,5 +40,13 @@ setuptools.setup(
           'netCDF4',
           'numpy',
           'pandas',
-  ]
+  ],
+  extras_require={
+    'arrow': ['pyarrow'],
+  },
+  entry_points={
+    'console_scripts': [
+      'sofasonix=SOFASonix.SOFACommand:main',
+    ],
+  }
 )